@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+AES加解密微基准
+对比旧版（拼接填充、切片复制）与当前 util.aes_help 在不同数据量下的单次耗时和内存分配，
+覆盖登录请求体（固定华米密钥/IV）到大体积Token存储（随机IV）
+
+用法: python benchmarks/bench_aes.py [-r 轮数]
+"""
+import argparse
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Crypto.Cipher import AES
+from Crypto.Random import get_random_bytes
+
+from util.aes_help import (HM_AES_IV, HM_AES_KEY, decrypt_data, encrypt_data, encrypt_huami_data)
+
+KEY = b"0123456789abcdef"
+
+# (名称, 字节数)：登录表单约 300B，单账号Token记录约 1KB，多账号存储 64KB~1MB
+SIZES = (("login", 300), ("record", 1024), ("store", 64 * 1024), ("large", 1024 * 1024))
+
+
+def legacy_encrypt(plain, key, iv=None):
+    """旧版 encrypt_data（逐字保留核心逻辑）"""
+    pad_len = 16 - (len(plain) % 16)
+    padded = plain + bytes([pad_len]) * pad_len
+    if iv is None:
+        iv = get_random_bytes(16)
+        return iv + AES.new(key, AES.MODE_CBC, iv).encrypt(padded)
+    return AES.new(key, AES.MODE_CBC, iv).encrypt(padded)
+
+
+def legacy_decrypt(data, key, iv=None):
+    """旧版 decrypt_data（逐字保留核心逻辑）"""
+    if iv is None:
+        iv, data = data[:16], data[16:]
+    padded = AES.new(key, AES.MODE_CBC, iv).decrypt(data)
+    pad_len = padded[-1]
+    if padded[-pad_len:] != bytes([pad_len]) * pad_len:
+        raise ValueError("invalid PKCS#7 padding")
+    return padded[:-pad_len]
+
+
+def measure(fn, repeat):
+    """返回 (单次秒数, 单次峰值分配字节)"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    per_call = min(timer.repeat(number=number, repeat=repeat)) / number
+
+    fn()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_call, peak - before
+
+
+def report(label, legacy, current):
+    (old_t, old_m), (new_t, new_m) = legacy, current
+    print(f"  {label:<16} 旧 {old_t * 1e6:>9.1f} us {old_m:>9} B   "
+          f"新 {new_t * 1e6:>9.1f} us {new_m:>9} B   {old_t / new_t:>5.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AES加解密微基准")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="计时轮数（每轮次数自动确定）")
+    args = parser.parse_args()
+
+    for name, size in SIZES:
+        plain = os.urandom(size)
+        sealed = encrypt_data(plain, KEY, None)
+        assert decrypt_data(sealed, KEY, None) == legacy_decrypt(sealed, KEY) == plain
+        assert encrypt_huami_data(plain) == legacy_encrypt(plain, HM_AES_KEY, HM_AES_IV)
+
+        print(f"{name} ({size} B)")
+        report("huami encrypt",
+               measure(lambda: legacy_encrypt(plain, HM_AES_KEY, HM_AES_IV), args.repeat),
+               measure(lambda: encrypt_huami_data(plain), args.repeat))
+        report("store encrypt",
+               measure(lambda: legacy_encrypt(plain, KEY), args.repeat),
+               measure(lambda: encrypt_data(plain, KEY, None), args.repeat))
+        report("store decrypt",
+               measure(lambda: legacy_decrypt(sealed, KEY), args.repeat),
+               measure(lambda: decrypt_data(sealed, KEY, None), args.repeat))
+        view = memoryview(bytearray(sealed))
+        report("decrypt (view)",
+               measure(lambda: legacy_decrypt(bytes(view), KEY), args.repeat),
+               measure(lambda: decrypt_data(view, KEY, None), args.repeat))
+
+
+if __name__ == "__main__":
+    main()
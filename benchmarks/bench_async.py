@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+同步 / 异步编排对比基准
+每个真实主机对应一个本地模拟服务（共享Token状态），新连接带建立延迟以模拟TLS握手，
+分别用同步流程和 --async 运行 main.main()，比较墙钟时间和请求数
+场景：
+  - cold   无Token缓存，密码登录（登录、换Token、刷步数分属不同主机）
+  - warm   app_token在有效期内，直接刷步数
+  - stale  app_token临近过期：先联网校验，结束后主动续期
+三个场景都开启 Server酱 和 Webhook 推送；--backend sqlite 时Token存储使用SQLite后端
+（异步编排中加载、保存、关闭分别发生在不同线程）。任一运行退出码非0时以1退出
+
+用法: python benchmarks/bench_async.py [--runs N] [--latency 秒] [--connect-latency 秒] [--backend file|sqlite] [-v]
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main as zepp_main
+from mock_server import MockConfig, MockState, MockZeppServer, WEBHOOK_PATH
+from util import config as runtime_config
+
+SCENARIOS = ("cold", "warm", "stale")
+
+
+def run_main(argv, verbose: bool):
+    """运行一次 main.main()，返回 (退出码, 墙钟秒数)"""
+    out = sys.stdout if verbose else io.StringIO()
+    start = time.perf_counter()
+    code = 0
+    with contextlib.redirect_stdout(out):
+        try:
+            zepp_main.main(argv)
+        except SystemExit as e:
+            code = e.code or 0
+    return code, time.perf_counter() - start
+
+
+def start_hosts(config: MockConfig):
+    """每个接口主机（含Server酱，另加一个Webhook地址）各启动一个模拟服务，返回服务列表"""
+    state = MockState(config)
+    servers = {}
+    for name, url in list(runtime_config.DEFAULT_ENDPOINTS.items()):
+        host = urlsplit(url).netloc
+        if host not in servers:
+            servers[host] = MockZeppServer(state=state).start()
+        runtime_config.DEFAULT_ENDPOINTS[name] = servers[host].base_url + urlsplit(url).path
+    webhook = MockZeppServer(state=state).start()
+    os.environ["NOTIFY_WEBHOOK"] = webhook.base_url + WEBHOOK_PATH
+    return state, [*servers.values(), webhook]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同步/异步编排对比（本地模拟服务）")
+    parser.add_argument("--runs", type=int, default=5, help="每种模式的运行次数（取中位数）")
+    parser.add_argument("--latency", type=float, default=0.03, help="每个请求的服务端延迟（秒）")
+    parser.add_argument("--connect-latency", type=float, default=0.1, help="每条新连接的建立延迟（秒）")
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append", help="只运行指定场景（可重复）")
+    parser.add_argument("--backend", choices=("file", "sqlite"), default="file", help="Token存储后端")
+    parser.add_argument("-v", "--verbose", action="store_true", help="显示主程序输出")
+    args = parser.parse_args()
+
+    os.environ.pop("ZEPP_API_BASE", None)
+    os.environ.pop("GITHUB_EVENT_NAME", None)
+    os.environ.setdefault("ZEPP_USER", "13800000000")
+    os.environ.setdefault("ZEPP_PWD", "mock-password")
+    os.environ.setdefault("AES_KEY", "0123456789abcdef")
+    os.environ["SCKEY"] = "SCTmockkey"
+    os.environ["TOKEN_BACKEND"] = args.backend
+    os.environ["NOTIFY_HOUR"] = str(zepp_main.get_beijing_time().hour)
+
+    config = MockConfig(latency=args.latency, connect_latency=args.connect_latency)
+    state, servers = start_hosts(config)
+    print(f"模拟主机 {len(servers)} 个，请求延迟 {args.latency * 1000:.0f} ms，"
+          f"建连延迟 {args.connect_latency * 1000:.0f} ms")
+
+    default_ttl = dict(zepp_main.Config.TOKEN_TTL)
+    token_path = zepp_main.Config.TOKEN_DB if args.backend == "sqlite" else zepp_main.Config.TOKEN_FILE
+    failures = 0
+    workdir = tempfile.TemporaryDirectory()
+    os.chdir(workdir.name)
+    try:
+        # 生成一份Token缓存作为 warm / stale 场景的起点
+        run_main([], args.verbose)
+        with open(token_path, "rb") as f:
+            token_snapshot = f.read()
+
+        for scenario in args.scenario or SCENARIOS:
+            # stale：app_token有效期设为0，触发联网校验和主动续期
+            zepp_main.Config.TOKEN_TTL = dict(default_ttl, app_token=0) if scenario == "stale" else default_ttl
+            walls = {"sync": [], "async": []}
+            requests = {}
+            for _ in range(args.runs):
+                for mode, argv in (("sync", []), ("async", ["--async"])):
+                    if scenario == "cold":
+                        if os.path.exists(token_path):
+                            os.remove(token_path)
+                    else:
+                        with open(token_path, "wb") as f:
+                            f.write(token_snapshot)
+                    if os.path.exists(zepp_main.Config.NOTIFY_QUEUE_FILE):
+                        os.remove(zepp_main.Config.NOTIFY_QUEUE_FILE)
+                    state.reset_counts()
+                    code, wall = run_main(argv, args.verbose)
+                    if code != 0:
+                        print(f"[失败] {scenario}/{mode} 退出码 {code}")
+                        failures += 1
+                    walls[mode].append(wall)
+                    requests[mode] = sum(state.counts.values())
+
+            sync_ms = statistics.median(walls["sync"]) * 1000
+            async_ms = statistics.median(walls["async"]) * 1000
+            print(f"\n[{scenario}] 同步 {sync_ms:.0f} ms（请求 {requests['sync']} 次）  "
+                  f"异步 {async_ms:.0f} ms（请求 {requests['async']} 次）  "
+                  f"节省 {sync_ms - async_ms:.0f} ms（{(sync_ms - async_ms) / sync_ms:.0%}）")
+    finally:
+        zepp_main.Config.TOKEN_TTL = default_ttl
+        os.chdir(ROOT)
+        workdir.cleanup()
+        for server in servers:
+            server.stop()
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+端到端基准：在本地模拟服务上完整运行 main.main()
+场景：
+  - cold      无Token缓存，走完整密码登录
+  - warm      复用上一次运行写出的Token缓存
+  - degraded  有缓存，但服务端有延迟、500 和 429
+  - notify    有缓存，并向模拟服务的 Server酱 和 Webhook 接口推送（与保存Token并行）
+输出每个场景的墙钟时间、各阶段耗时和请求次数
+--virtual-clock 时每次运行使用固定种子的虚拟时钟（并重置模拟服务的故障种子）：
+退避等待立即返回，步数、虚拟IP、抖动和故障序列每次都相同
+
+用法: python benchmarks/bench_e2e.py [--runs N] [--virtual-clock] [-v]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main as zepp_main
+from mock_server import MockConfig, MockZeppServer
+from util.clock import Clock, VirtualClock, use_clock
+
+SCENARIOS = {
+    "cold": dict(config=MockConfig(latency=0.01), warm=False),
+    "warm": dict(config=MockConfig(latency=0.01), warm=True),
+    "degraded": dict(config=MockConfig(latency=0.05, error_rate=0.2, rate_limit_rate=0.1, seed=7),
+                     warm=True),
+    "notify": dict(config=MockConfig(latency=0.05), warm=True, notify=True),
+}
+
+
+def run_main(verbose: bool, clock: Clock = None):
+    """运行一次 main.main()，返回 (退出码, 墙钟秒数)"""
+    out = sys.stdout if verbose else io.StringIO()
+    start = time.perf_counter()
+    code = 0
+    with contextlib.redirect_stdout(out), use_clock(clock or Clock()):
+        try:
+            zepp_main.main([])
+        except SystemExit as e:
+            code = e.code or 0
+    return code, time.perf_counter() - start
+
+
+def summarize_report(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    phases = {}
+    for record in report["phases"]:
+        phases[record["phase"]] = phases.get(record["phase"], 0) + record["duration_ms"]
+    requests_by_phase = {}
+    for record in report["http"]:
+        phase = record["phase"] or "-"
+        requests_by_phase[phase] = requests_by_phase.get(phase, 0) + 1
+    return report["meta"], phases, requests_by_phase
+
+
+def run_scenario(name: str, spec: dict, runs: int, verbose: bool, virtual_clock: bool = False):
+    with tempfile.TemporaryDirectory() as workdir, MockZeppServer(spec["config"]) as server:
+        os.chdir(workdir)
+        os.environ["ZEPP_API_BASE"] = server.base_url
+        if spec.get("notify"):
+            # 把推送时刻设为当前小时，每次运行都会推送
+            os.environ["SCKEY"] = "SCTmockkey"
+            os.environ["NOTIFY_WEBHOOK"] = f"{server.base_url}/webhook"
+            os.environ["NOTIFY_HOUR"] = str(zepp_main.get_beijing_time().hour)
+
+        if spec["warm"]:
+            # 先用无故障配置跑一次，生成Token缓存
+            faults = (server.config.latency, server.config.error_rate, server.config.rate_limit_rate)
+            server.config.latency = server.config.error_rate = server.config.rate_limit_rate = 0
+            run_main(verbose, VirtualClock() if virtual_clock else None)
+            server.config.latency, server.config.error_rate, server.config.rate_limit_rate = faults
+
+        for i in range(runs):
+            if not spec["warm"] and os.path.exists(zepp_main.Config.TOKEN_FILE):
+                os.remove(zepp_main.Config.TOKEN_FILE)
+            server.state.reset_counts()
+            clock = None
+            if virtual_clock:
+                clock = VirtualClock(seed=0)
+                server.state.rng.seed(server.config.seed)
+            code, wall = run_main(verbose, clock)
+            meta, phases, requests_by_phase = summarize_report(zepp_main.Config.REPORT_FILE)
+
+            print(f"\n[{name} #{i + 1}] 退出码 {code}  墙钟 {wall * 1000:.0f} ms  "
+                  f"Token层级 {meta.get('token_tier')}  请求 {sum(server.state.counts.values())} 次"
+                  + (f"  省去等待 {clock.slept * 1000:.0f} ms" if clock and clock.slept else ""))
+            for phase, ms in phases.items():
+                print(f"    {phase:<32} {ms:>9.1f} ms  请求 {requests_by_phase.get(phase, 0)}")
+            print(f"    服务端计数: {server.state.counts}")
+            if spec.get("notify"):
+                print(f"    已收到推送: Server酱 {len(server.state.sent_messages)} 条，"
+                      f"Webhook {len(server.state.webhook_messages)} 条")
+        for name in ("SCKEY", "NOTIFY_WEBHOOK", "NOTIFY_HOUR"):
+            os.environ.pop(name, None)
+        os.chdir(ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端基准（本地模拟服务）")
+    parser.add_argument("--runs", type=int, default=3, help="每个场景运行次数")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), action="append",
+                        help="只运行指定场景（可重复）")
+    parser.add_argument("--virtual-clock", action="store_true",
+                        help="使用虚拟时钟：退避等待立即返回，随机数和故障序列固定，结果可重复")
+    parser.add_argument("-v", "--verbose", action="store_true", help="显示主程序输出")
+    args = parser.parse_args()
+
+    os.environ.setdefault("ZEPP_USER", "13800000000")
+    os.environ.setdefault("ZEPP_PWD", "mock-password")
+    os.environ.setdefault("AES_KEY", "0123456789abcdef")
+    os.environ.pop("SCKEY", None)
+    if not args.virtual_clock:
+        # 退避基数调小，避免降级场景在重试等待上花费过多时间（虚拟时钟下等待不占用时间）
+        zepp_main.Config.RETRY_DELAY = 0.1
+
+    for name in args.scenario or SCENARIOS:
+        run_scenario(name, SCENARIOS[name], args.runs, args.verbose, args.virtual_clock)
+
+
+if __name__ == "__main__":
+    main()
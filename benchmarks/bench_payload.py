@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+band_data 请求体构造微基准
+对比旧版正则改写路径与预编译模板路径的单次耗时和内存分配
+
+用法: python benchmarks/bench_payload.py [-r 轮数]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.constants import DATA_JSON
+from util.data_template import build_band_data, get_band_data_template
+
+DATE = "2024-01-01"
+STEP = 23456
+USERID = "1188760659"
+
+
+def legacy_build(userid, today, step):
+    """旧版 update_step 中的构造方式（逐字保留）"""
+    data_json = DATA_JSON
+    find_date = re.compile(r".*?date%22%3A%22(.*?)%22%2C%22data.*?")
+    find_step = re.compile(r".*?ttl%5C%22%3A(.*?)%2C%5C%22dis.*?")
+    data_json = re.sub(find_date.findall(data_json)[0], today, str(data_json))
+    data_json = re.sub(find_step.findall(data_json)[0], str(step), str(data_json))
+    return f'userid={userid}&last_sync_data_time=1597306380&device_type=0&last_deviceid=DA932FFFFE8816E7&data_json={data_json}'
+
+
+def template_build(userid, today, step):
+    return build_band_data(userid, today, step)
+
+
+def measure(name, fn, repeat):
+    timer = timeit.Timer(lambda: fn(USERID, DATE, STEP))
+    number, _ = timer.autorange()
+    per_call = min(timer.repeat(number=number, repeat=repeat)) / number
+
+    tracemalloc.start()
+    fn(USERID, DATE, STEP)
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    fn(USERID, DATE, STEP)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<10} {per_call * 1e6:>10.1f} us/调用  峰值分配 {peak - before:>8} B")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description="band_data 请求体构造微基准")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="计时轮数（每轮次数自动确定）")
+    args = parser.parse_args()
+
+    get_band_data_template()
+    assert legacy_build(USERID, DATE, STEP) == template_build(USERID, DATE, STEP), "两种构造方式结果不一致"
+
+    print(f"DATA_JSON 长度: {len(DATA_JSON)} 字节")
+    legacy = measure("regex", legacy_build, args.repeat)
+    template = measure("template", template_build, args.repeat)
+    print(f"加速比: {legacy / template:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
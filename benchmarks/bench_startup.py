@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+冷启动预算检查
+运行 python -X importtime main.py --help，统计主程序自身引入的导入耗时
+（扣除解释器启动时固有的导入），并确认 requests / pycryptodome / DATA_JSON 没有被提前加载。
+超出预算或出现禁止的模块时以退出码 1 结束，可直接放进 CI
+
+用法: python benchmarks/bench_startup.py [--budget-ms 毫秒] [-r 轮数] [-v]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --help 路径上不应出现的模块（前缀匹配）
+# dataclasses 会连带导入 inspect（约 10 ms），启动路径上的数据类型因此使用
+# NamedTuple 或 __slots__ 类（util.config、util.token_record）
+FORBIDDEN = ("requests", "urllib3", "Crypto", "pytz", "util.constants", "util.zepp_helper",
+             "util.http_client", "util.token_store", "sqlite3", "dataclasses", "inspect")
+
+DEFAULT_BUDGET_MS = 40.0
+
+
+def importtime(args):
+    """运行一次并解析 -X importtime 输出，返回 [(模块名, 自身耗时us)]"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=ROOT,
+                          capture_output=True, text=True, check=True)
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(self_us)))
+    return entries
+
+
+def measure(repeat: int):
+    """取多轮中的最小值，返回 (扣除基线后的导入耗时ms, 本次导入的模块集合)"""
+    baseline = {name for name, _ in importtime(["-c", "pass"])}
+    best, modules = None, set()
+    for _ in range(repeat):
+        entries = importtime(["main.py", "--help"])
+        total = sum(us for name, us in entries if name not in baseline) / 1000
+        if best is None or total < best:
+            best = total
+            modules = {name for name, _ in entries if name not in baseline}
+    return best, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动导入耗时预算检查")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"导入耗时预算（毫秒，默认 {DEFAULT_BUDGET_MS}）")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="运行轮数（取最小值）")
+    parser.add_argument("-v", "--verbose", action="store_true", help="列出导入的模块")
+    args = parser.parse_args()
+
+    total, modules = measure(args.repeat)
+    loaded = sorted(m for m in modules if m.startswith(FORBIDDEN))
+    print(f"main.py --help 导入耗时: {total:.1f} ms（预算 {args.budget_ms:.1f} ms），"
+          f"共 {len(modules)} 个模块")
+    if args.verbose:
+        print("  " + ", ".join(sorted(modules)))
+
+    failed = False
+    if loaded:
+        print(f"[失败] 启动路径加载了应延迟导入的模块: {', '.join(loaded)}")
+        failed = True
+    if total > args.budget_ms:
+        print(f"[失败] 导入耗时超出预算 {total - args.budget_ms:.1f} ms")
+        failed = True
+    if not failed:
+        print("[成功] 冷启动在预算内")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
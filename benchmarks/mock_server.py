@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+本地模拟 Zepp/华米 服务
+实现 zepp_helper 用到的六个接口（含 login_access_token 的 303 重定向），
+以及接收推送的 Server酱（/<key>.send）和 Webhook（/webhook）接口，
+支持配置延迟、错误率、429 限流和Token过期时间，并按接口统计请求次数
+
+单独运行: python benchmarks/mock_server.py --port 8000 --latency 0.05
+配合主程序: ZEPP_API_BASE=http://127.0.0.1:8000 python main.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+LOGIN_PATH = "/v2/registrations/tokens"
+CLIENT_LOGIN_PATH = "/v2/client/login"
+APP_TOKENS_PATH = "/v1/client/app_tokens"
+USER_INFO_PATH = "/huami.health.getUserInfo.json"
+RENEW_PATH = "/v1/client/renew_login_token"
+BAND_DATA_PATH = "/v1/data/band_data.json"
+WEBHOOK_PATH = "/webhook"
+
+USER_ID = "1188760659"
+
+
+class MockConfig:
+    """
+    模拟服务行为配置
+    :param latency: 每个请求的固定延迟（秒）
+    :param connect_latency: 每条新连接的建立延迟（秒），模拟TLS握手；在接受连接时开始计时，
+                            客户端提前建连（预热）时这段时间可以与其他工作重叠
+    :param error_rate: 返回 500 的概率
+    :param rate_limit_rate: 返回 429 的概率
+    :param retry_after: 429 响应携带的 Retry-After（秒）
+    :param app_token_ttl/login_token_ttl: Token有效期（秒），None 为永不过期
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after: int = 0, app_token_ttl: Optional[float] = None,
+                 login_token_ttl: Optional[float] = None, seed: int = 0, connect_latency: float = 0.0):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.app_token_ttl = app_token_ttl
+        self.login_token_ttl = login_token_ttl
+        self.seed = seed
+
+
+class MockState:
+    """已签发的Token与请求计数"""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.access_codes: Dict[str, float] = {}
+        self.login_tokens: Dict[str, float] = {}
+        self.app_tokens: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.sent_messages = []
+        self.webhook_messages = []
+
+    def count(self, path: str):
+        with self.lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+
+    def reset_counts(self):
+        with self.lock:
+            self.counts.clear()
+
+    def roll(self, rate: float) -> bool:
+        with self.lock:
+            return rate > 0 and self.rng.random() < rate
+
+    def issue(self, store: Dict[str, float], prefix: str) -> str:
+        token = f"{prefix}-{uuid.uuid4().hex}"
+        with self.lock:
+            store[token] = time.time()
+        return token
+
+    @staticmethod
+    def _valid(store: Dict[str, float], token: str, ttl: Optional[float]) -> bool:
+        issued = store.get(token)
+        if issued is None:
+            return False
+        return ttl is None or time.time() - issued < ttl
+
+    def valid_login_token(self, token: str) -> bool:
+        return self._valid(self.login_tokens, token, self.config.login_token_ttl)
+
+    def valid_app_token(self, token: str) -> bool:
+        return self._valid(self.app_tokens, token, self.config.app_token_ttl)
+
+    def expire_all(self):
+        """使所有已签发Token失效（模拟服务端强制下线）"""
+        with self.lock:
+            self.login_tokens.clear()
+            self.app_tokens.clear()
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockZepp/1.0"
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        if self.state.config.connect_latency:
+            time.sleep(self.state.config.connect_latency)
+
+    # ---------- 响应工具 ----------
+
+    def _send_json(self, status: int, payload: Dict, headers: Dict[str, str] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _form(self, body: bytes) -> Dict[str, str]:
+        return {k: v[0] for k, v in parse_qs(body.decode("utf-8", errors="replace")).items()}
+
+    def _inject_faults(self) -> bool:
+        """按配置注入延迟、429、500，已响应时返回 True"""
+        config = self.state.config
+        if config.latency:
+            time.sleep(config.latency)
+        if self.state.roll(config.rate_limit_rate):
+            self._send_json(429, {"message": "too many requests"},
+                            {"Retry-After": str(config.retry_after)})
+            return True
+        if self.state.roll(config.error_rate):
+            self._send_json(500, {"message": "internal error"})
+            return True
+        return False
+
+    # ---------- 路由 ----------
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str):
+        parts = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        body = self._read_body() if method == "POST" else b""
+        path = parts.path
+        self.state.count(path)
+
+        if self._inject_faults():
+            return
+
+        routes = {
+            ("POST", LOGIN_PATH): self._login,
+            ("POST", CLIENT_LOGIN_PATH): self._client_login,
+            ("GET", APP_TOKENS_PATH): self._app_tokens,
+            ("GET", USER_INFO_PATH): self._user_info,
+            ("GET", RENEW_PATH): self._renew,
+            ("POST", BAND_DATA_PATH): self._band_data,
+            ("POST", WEBHOOK_PATH): self._webhook,
+        }
+        handler = routes.get((method, path))
+        if handler is None and method == "POST" and path.endswith(".send"):
+            handler = self._server_chan
+        if handler is None:
+            self._send_json(404, {"message": "not found"})
+            return
+        handler(query, body)
+
+    def _login(self, query, body):
+        # 请求体为AES加密的表单，模拟服务不解密，只要非空即视为登录成功
+        if not body:
+            location = "https://s3-us-west-2.amazonaws.com/hm-registration/successsignin.html?error=0106&"
+        else:
+            code = self.state.issue(self.state.access_codes, "access")
+            location = ("https://s3-us-west-2.amazonaws.com/hm-registration/successsignin.html"
+                        f"?region=cn&access={code}&country_code=CN&expiration=1999999999")
+        self.send_response(303)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _client_login(self, query, body):
+        form = self._form(body)
+        if form.get("code") not in self.state.access_codes:
+            self._send_json(200, {"result": "error", "error_code": "0106"})
+            return
+        login_token = self.state.issue(self.state.login_tokens, "login")
+        app_token = self.state.issue(self.state.app_tokens, "app")
+        self._send_json(200, {"result": "ok", "token_info": {
+            "login_token": login_token, "app_token": app_token, "user_id": USER_ID}})
+
+    def _app_tokens(self, query, body):
+        if not self.state.valid_login_token(query.get("login_token", "")):
+            self._send_json(200, {"result": "error", "error_code": "0115"})
+            return
+        app_token = self.state.issue(self.state.app_tokens, "app")
+        self._send_json(200, {"result": "ok", "token_info": {"app_token": app_token}})
+
+    def _user_info(self, query, body):
+        if not self.state.valid_app_token(self.headers.get("apptoken", "")):
+            self._send_json(401, {"code": 0, "message": "invalid token"})
+            return
+        self._send_json(200, {"code": 1, "message": "success", "data": {"userid": USER_ID}})
+
+    def _renew(self, query, body):
+        if not self.state.valid_login_token(query.get("login_token", "")):
+            self._send_json(200, {"result": "error"})
+            return
+        login_token = self.state.issue(self.state.login_tokens, "login")
+        self._send_json(200, {"result": "ok", "token_info": {"login_token": login_token}})
+
+    def _band_data(self, query, body):
+        if not self.state.valid_app_token(self.headers.get("apptoken", "")):
+            self._send_json(401, {"code": 0, "message": "invalid token"})
+            return
+        self._send_json(200, {"code": 1, "message": "success"})
+
+    def _server_chan(self, query, body):
+        self.state.sent_messages.append(self._form(body))
+        self._send_json(200, {"code": 0, "message": "", "data": {}})
+
+    def _webhook(self, query, body):
+        self.state.webhook_messages.append(json.loads(body or b"{}"))
+        self._send_json(200, {"ok": True})
+
+
+class MockZeppServer:
+    """在后台线程运行的模拟服务"""
+
+    def __init__(self, config: MockConfig = None, host: str = "127.0.0.1", port: int = 0,
+                 state: MockState = None):
+        # 传入 state 时与其他实例共享Token和计数（模拟同一服务的多个主机）
+        self.state = state or MockState(config or MockConfig())
+        handler = type("BoundMockHandler", (MockHandler,), {"state": self.state})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def config(self) -> MockConfig:
+        return self.state.config
+
+    def start(self) -> "MockZeppServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 Zepp/华米 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的延迟（秒）")
+    parser.add_argument("--connect-latency", type=float, default=0.0, help="每条新连接的建立延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回429的概率")
+    parser.add_argument("--retry-after", type=int, default=1, help="429响应的Retry-After（秒）")
+    parser.add_argument("--app-token-ttl", type=float, default=None, help="app_token有效期（秒）")
+    parser.add_argument("--login-token-ttl", type=float, default=None, help="login_token有效期（秒）")
+    args = parser.parse_args()
+
+    config = MockConfig(args.latency, args.error_rate, args.rate_limit_rate, args.retry_after,
+                        args.app_token_ttl, args.login_token_ttl, connect_latency=args.connect_latency)
+    server = MockZeppServer(config, args.host, args.port)
+    print(f"模拟服务已启动: {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
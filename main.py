@@ -4,21 +4,45 @@ Zepp自动刷步数主程序
 Token缓存、自动推送、错误重试
 直接读取环境变量
 """
+from __future__ import annotations
+
 import math
-import traceback
-from datetime import datetime
-import pytz
-import uuid
+import logging
+import urllib.parse
+from datetime import datetime, timedelta
 import json
-import random
-import time
 import os
 import sys
-from typing import Optional, Tuple, Dict, List
+import signal
+import argparse
+import threading
+from typing import TYPE_CHECKING, Optional, Tuple, Dict, List
+
+from util.lazy import lazy_import
+from util.clock import beijing_timezone, format_now, get_beijing_time, get_clock
+from util.config import (DEFAULT_AES_KEY, ApiConfig, ConfigError, RuntimeConfig, parse_aes_key,
+                         split_accounts)
+from util.log import get_logger, setup_logging
+from util.token_cache import TokenCache, FRESH, NEAR_EXPIRY, EXPIRED, UNKNOWN
+from util.token_record import TOKEN_TIERS, TokenRecord
+from util.deadline import Deadline, DeadlineExceeded
+from util.run_report import RunReport
+from util.profiler import profiled, start_profiling, stop_profiling
+
+if TYPE_CHECKING:
+    from util.cassette import Cassette
+    from util.http_client import HttpClient
+    from util.notifier import Notifier
+    from util.token_store import TokenBackend
+
+# 网络和加解密相关模块按需加载：--help、参数错误等路径不导入 requests / pycryptodome
+zeppHelper = lazy_import("util.zepp_helper")
+http_client = lazy_import("util.http_client")
+token_store = lazy_import("util.token_store")
+notifier = lazy_import("util.notifier")
 
-import requests
-from util.aes_help import encrypt_data, decrypt_data, get_aes_key
-import util.zepp_helper as zeppHelper
+
+logger = get_logger(__name__)
 
 
 # ==================== 全局配置 ====================
@@ -26,12 +50,43 @@ import util.zepp_helper as zeppHelper
 class Config:
     """全局配置类"""
     TOKEN_FILE = "encrypted_tokens.data"
+    TOKEN_DB = "tokens.db"                # SQLite后端数据库文件
+    TOKEN_BACKEND = "file"                # Token存储后端：file / sqlite，可用环境变量 TOKEN_BACKEND 覆盖
+    CIRCUIT_FILE = "circuit_state.json"  # 熔断状态，与Token缓存一同保存
+    CIRCUIT_FAILURE_THRESHOLD = 3         # 连续失败多少次后熔断
+    CIRCUIT_COOLDOWN = 4 * 3600           # 熔断后多久允许探测（秒）
+    REPORT_FILE = "run_report.json"       # 机器可读的运行报告
+    NOTIFY_QUEUE_FILE = "notify_queue.json"  # 待发/发送失败的通知，下次运行合并重试
+    NOTIFY_HOUR = 19                      # 推送时刻（北京时间小时），可用环境变量 NOTIFY_HOUR 覆盖
+    NOTIFY_TIMEOUT = 15                   # 推送总等待上限（秒），超时的消息留到下次运行
+    NOTIFY_QUEUE_MAX = 20                 # 通知队列最多保留的消息数
+    DAEMON_SCHEDULE = "09:30,15:25,19:26"  # 守护模式每日运行时间（北京时间），可用环境变量 ZEPP_SCHEDULE 覆盖
+    DAEMON_POLL = 60                      # 守护模式等待时的最长检查间隔（秒），用于感知系统时间跳变
+    HISTORY_FILE = "run_history.jsonl"    # 运行历史（每次运行一行），供 history 子命令查询
+    HISTORY_MAX = 1000                    # 运行历史最多保留的记录数
+    PROFILE_DIR = "profile"               # --profile 输出目录（cProfile / tracemalloc 快照）
+    PROFILE_TOP = 10                      # 剖析摘要中每个阶段列出的条目数，可用环境变量 ZEPP_PROFILE_TOP 覆盖
     DEFAULT_MIN_STEP = 10000
     DEFAULT_MAX_STEP = 35000
     DEFAULT_SLEEP_GAP = 5.0
-    REQUEST_TIMEOUT = 30
+    REQUEST_TIMEOUT = 30  # HTTP默认超时及提交步数的超时（秒）
+    API_TIMEOUT = 10      # 登录、Token类接口的超时（秒）
+    RUN_DEADLINE = 300  # 整次运行的时间预算（秒），可用环境变量 RUN_DEADLINE 覆盖
+    HTTP_POOL_SIZE = 4
     MAX_RETRY = 3
-    RETRY_DELAY = 2
+    RETRY_DELAY = 2       # 指数退避基数（秒）
+    RETRY_MAX_DELAY = 30  # 单次退避上限（秒）
+    
+    # Token默认有效期（秒），运行中会根据校验结果学习实际值
+    TOKEN_TTL = {
+        'access_token': 90 * 86400,
+        'login_token': 30 * 86400,
+        'app_token': 12 * 3600,
+    }
+    # 剩余有效期低于该比例时才联网校验
+    TOKEN_REFRESH_MARGIN = 0.2
+    # 主动续期：已用掉一半有效期即在主流程结束后续期
+    TOKEN_RENEW_MARGIN = 0.5
     
     # 时间段步数配置（手动触发）
     MANUAL_STEP_RANGES = {
@@ -49,7 +104,7 @@ def get_int_value_default(value: str, default: int) -> int:
     try:
         return int(value) if value else default
     except (ValueError, TypeError):
-        print(f"[警告] 值 {value} 无效，使用默认值: {default}")
+        logger.warning("[警告] 值 %s 无效，使用默认值: %s", value, default)
         return default
 
 
@@ -58,7 +113,7 @@ def get_float_value_default(value: str, default: float) -> float:
     try:
         return float(value) if value else default
     except (ValueError, TypeError):
-        print(f"[警告] 值 {value} 无效，使用默认值: {default}")
+        logger.warning("[警告] 值 %s 无效，使用默认值: %s", value, default)
         return default
 
 
@@ -69,32 +124,16 @@ def get_bool_value_default(value: str, default: bool) -> bool:
     return value.upper() in ('TRUE', '1', 'YES', 'ON')
 
 
-def get_beijing_time() -> datetime:
-    """获取北京时间"""
-    target_timezone = pytz.timezone('Asia/Shanghai')
-    return datetime.now(target_timezone)
-
-
-def format_now() -> str:
-    """格式化当前时间"""
-    return get_beijing_time().strftime("%Y-%m-%d %H:%M:%S")
-
-
-def get_timestamp() -> str:
-    """获取时间戳（毫秒）"""
-    current_time = get_beijing_time()
-    return "%.0f" % (current_time.timestamp() * 1000)
-
-
 def fake_ip() -> str:
     """
     生成虚拟IP地址（国内IP段）
     IP段：223.64.0.0 - 223.117.255.255 或 39.0.0.0 - 39.255.255.255
     """
-    if random.choice([True, False]):
-        return f"39.149.{random.randint(0, 255)}.{random.randint(0, 255)}"
+    rng = get_clock().rng
+    if rng.choice([True, False]):
+        return f"39.149.{rng.randint(0, 255)}.{rng.randint(0, 255)}"
     else:
-        return f"223.{random.randint(64, 117)}.{random.randint(0, 255)}.{random.randint(0, 255)}"
+        return f"223.{rng.randint(64, 117)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}"
 
 
 def desensitize_user_name(user: str) -> str:
@@ -107,9 +146,12 @@ def desensitize_user_name(user: str) -> str:
     return "*" * (length - 2) + user[-2:]
 
 
-def is_manual_trigger() -> bool:
-    """判断是否为手动触发"""
-    return os.environ.get('GITHUB_EVENT_NAME') == 'workflow_dispatch'
+def normalize_user(user: str) -> str:
+    """统一账号格式：手机号补全+86前缀（Token缓存以此为键）"""
+    user = str(user).strip()
+    if user and not (user.startswith("+86") or "@" in user):
+        user = "+86" + user
+    return user
 
 
 def get_min_max_by_time(hour: int = None, minute: int = None) -> Tuple[int, int]:
@@ -135,101 +177,245 @@ def get_min_max_by_time(hour: int = None, minute: int = None) -> Tuple[int, int]
         return Config.DEFAULT_MIN_STEP, Config.DEFAULT_MAX_STEP
 
 
-def server_send(title: str, body: str, sckey: str = None):
+def build_runtime_config(args: argparse.Namespace, environ=None) -> RuntimeConfig:
     """
-    Server酱推送（支持Server酱Turbo）
-    :param title: 推送标题
-    :param body: 推送正文
-    :param sckey: Server酱密钥
+    由环境变量和命令行参数构建本次运行的配置（只在入口处调用一次）
+    数值无效时使用默认值并给出警告；账号校验由 RuntimeConfig.check_accounts 在需要时进行
     """
-    if not sckey or sckey.upper() == 'NO':
-        return
+    env = os.environ if environ is None else environ
     
-    server_url = f"https://sctapi.ftqq.com/{sckey}.send"
+    def get(name: str) -> str:
+        return env.get(name, '').strip()
     
-    data = {
-        'text': title,
-        'desp': body
-    }
+    aes_value = env.get('AES_KEY')
+    aes_key = parse_aes_key(aes_value)
+    if aes_value and aes_key is None:
+        logger.warning("[警告] AES_KEY 长度不是16个字符，已忽略")
+    api_base = get('ZEPP_API_BASE')
+    cassette = getattr(args, 'cassette', None)
+    return RuntimeConfig(
+        users=split_accounts(get('ZEPP_USER')),
+        passwords=split_accounts(get('ZEPP_PWD')),
+        sckey=get('SCKEY'),
+        aes_key=aes_key or DEFAULT_AES_KEY,
+        aes_key_configured=aes_key is not None,
+        api=ApiConfig.build(api_base, timeout=Config.API_TIMEOUT, step_timeout=Config.REQUEST_TIMEOUT),
+        api_base=api_base,
+        request_timeout=Config.REQUEST_TIMEOUT,
+        run_deadline=get_float_value_default(get('RUN_DEADLINE'), Config.RUN_DEADLINE),
+        retry_attempts=Config.MAX_RETRY,
+        retry_delay=Config.RETRY_DELAY,
+        retry_max_delay=Config.RETRY_MAX_DELAY,
+        token_backend=get('TOKEN_BACKEND') or Config.TOKEN_BACKEND,
+        notify_hour=get_int_value_default(get('NOTIFY_HOUR'), Config.NOTIFY_HOUR),
+        manual_trigger=env.get('GITHUB_EVENT_NAME') == 'workflow_dispatch',
+        schedule=get('ZEPP_SCHEDULE') or Config.DAEMON_SCHEDULE,
+        prom_file=get('ZEPP_PROM_FILE'),
+        cassette=cassette,
+        replay=(cassette or '').partition(':')[0].strip().lower() == 'replay',
+        profile=getattr(args, 'profile', False),
+        profile_top=get_int_value_default(get('ZEPP_PROFILE_TOP'), Config.PROFILE_TOP),
+        use_async=getattr(args, 'use_async', False),
+    )
+
+
+def build_client(config: RuntimeConfig, deadline: Deadline = None, report: RunReport = None,
+                 cassette: Cassette = None) -> HttpClient:
+    """按运行配置构建本次运行共用的HTTP客户端"""
+    from util.circuit_breaker import CircuitBreaker
+    from util.retry import RetryPolicy
     
-    try:
-        response = requests.post(server_url, data=data, timeout=Config.REQUEST_TIMEOUT)
-        if response.status_code == 200:
-            result = response.json()
-            if result.get('code') == 0:
-                print(f"[成功] Server酱推送成功")
-            else:
-                print(f"[失败] Server酱推送失败: {result.get('message', '未知错误')}")
-        else:
-            print(f"[失败] Server酱推送失败: HTTP {response.status_code}")
-    except requests.exceptions.Timeout:
-        print(f"[超时] Server酱推送超时")
-    except Exception as e:
-        print(f"[异常] Server酱推送异常: {str(e)}")
+    policy = RetryPolicy(config.retry_attempts, config.retry_delay, config.retry_max_delay)
+    if cassette and cassette.replaying:
+        # 回放不访问真实主机，熔断状态只在内存中生效，不覆盖状态文件
+        breaker = CircuitBreaker(None, Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_COOLDOWN)
+    else:
+        breaker = CircuitBreaker.load(Config.CIRCUIT_FILE,
+                                      failure_threshold=Config.CIRCUIT_FAILURE_THRESHOLD,
+                                      cooldown=Config.CIRCUIT_COOLDOWN)
+    return http_client.HttpClient(pool_maxsize=Config.HTTP_POOL_SIZE, timeout=config.request_timeout,
+                                  deadline=deadline, retry_policy=policy, breaker=breaker,
+                                  report=report, cassette=cassette)
 
 
 # ==================== Token管理 ====================
 
-def prepare_user_tokens() -> Dict:
-    """从加密文件加载Token缓存"""
-    if not os.path.exists(Config.TOKEN_FILE):
-        print(f"[信息] Token缓存文件不存在，将创建新文件")
+_token_backend: Optional[TokenBackend] = None
+
+
+def get_token_backend(config: RuntimeConfig) -> TokenBackend:
+    """本次运行共用的Token存储后端（加载与保存之间保留脏标记）"""
+    global _token_backend
+    if _token_backend is None:
+        _token_backend = token_store.open_token_backend(config.token_backend, config.aes_key,
+                                                        Config.TOKEN_FILE, Config.TOKEN_DB)
+    return _token_backend
+
+
+def close_token_backend():
+    global _token_backend
+    if _token_backend is not None:
+        _token_backend.close()
+        _token_backend = None
+
+
+@profiled("prepare_user_tokens")
+def prepare_user_tokens(config: RuntimeConfig, users: List[str] = None) -> Dict[str, TokenRecord]:
+    """
+    从加密文件加载Token缓存
+    :param users: 只解密这些账号的记录，None 表示全部
+    """
+    store = get_token_backend(config)
+    if store.name == "file" and not os.path.exists(Config.TOKEN_FILE):
+        logger.info("[信息] Token缓存文件不存在，将创建新文件")
         return {}
     
     try:
-        with open(Config.TOKEN_FILE, 'rb') as f:
-            encrypted_data = f.read()
-        
-        if not encrypted_data:
-            print(f"[警告] Token缓存文件为空")
-            return {}
-        
-        decrypted_data = decrypt_data(encrypted_data, get_aes_key(), None)
-        tokens = json.loads(decrypted_data.decode('utf-8', errors='strict'))
-        
-        print(f"[成功] 已加载 {len(tokens)} 个账号的Token缓存")
+        tokens = store.load(users)
+        logger.info("[成功] 已加载 %s 个账号的Token缓存", len(tokens))
         return tokens
     except json.JSONDecodeError as e:
-        print(f"[错误] Token文件JSON解析失败: {str(e)}")
-        return {}
+        logger.error("[错误] Token文件JSON解析失败: %s", e)
     except Exception as e:
-        print(f"[警告] Token解密失败（可能是密钥错误）: {str(e)}")
-        return {}
+        logger.warning("[警告] Token解密失败（可能是密钥错误）: %s", e)
+    store.reset()
+    return {}
 
 
-def persist_user_tokens(user_tokens: Dict) -> bool:
+@profiled("persist_user_tokens")
+def persist_user_tokens(config: RuntimeConfig, user_tokens: Dict[str, TokenRecord]) -> bool:
     """
-    保存Token到加密文件
+    保存Token到加密文件（仅有变化的账号会重新加密，无变化时不写文件）
     :return: 是否保存成功
     """
+    if config.replay:
+        # 回放的响应中Token为脱敏占位符，不能写入真实缓存
+        logger.info("[回放] 回放模式不保存Token缓存")
+        return True
     try:
-        origin_str = json.dumps(user_tokens, ensure_ascii=False, indent=2)
-        encrypted_data = encrypt_data(origin_str.encode("utf-8"), get_aes_key(), None)
-        
-        with open(Config.TOKEN_FILE, 'wb') as f:
-            f.write(encrypted_data)
-        
-        print(f"[成功] Token已加密保存（{len(user_tokens)} 个账号）")
+        if get_token_backend(config).save(user_tokens):
+            logger.info("[成功] Token已加密保存（%s 个账号）", len(user_tokens))
+        else:
+            logger.info("[信息] Token未变化，跳过保存")
         return True
     except Exception as e:
-        print(f"[失败] Token保存失败: {str(e)}")
-        traceback.print_exc()
+        logger.error("[失败] Token保存失败: %s", e, exc_info=True)
         return False
 
 
+def renew_user_tokens(user_tokens: Dict[str, TokenRecord], client: HttpClient = None,
+                      token_cache: TokenCache = None, api: ApiConfig = None) -> int:
+    """
+    主动续期临近过期的login_token和app_token（不在刷步数关键路径上执行）
+    :return: 续期成功的Token数量
+    """
+    client = client or http_client.get_default_client()
+    token_cache = token_cache or TokenCache(Config.TOKEN_TTL, Config.TOKEN_REFRESH_MARGIN)
+    renewed = 0
+    
+    for user, record in user_tokens.items():
+        name = desensitize_user_name(user)
+        login_token = record.login_token
+        if not login_token:
+            continue
+        
+        # 续期login_token
+        if token_cache.freshness(record, "login_token", margin=Config.TOKEN_RENEW_MARGIN) != FRESH:
+            try:
+                new_login_token, msg = zeppHelper.renew_login_token(login_token, client=client, api=api)
+                if new_login_token:
+                    token_cache.observe_valid(record, "login_token")
+                    login_token = new_login_token
+                    record.set_token("login_token", login_token)
+                    renewed += 1
+                    logger.info("[续期] %s login_token续期成功", name)
+                else:
+                    logger.warning("[续期] %s login_token续期失败: %s", name, msg)
+            except Exception as e:
+                logger.warning("[续期] %s login_token续期异常: %s", name, e)
+        
+        # 续期app_token
+        if token_cache.freshness(record, "app_token", margin=Config.TOKEN_RENEW_MARGIN) != FRESH:
+            try:
+                app_token, msg = zeppHelper.grant_app_token(login_token, client=client, api=api)
+                if app_token:
+                    token_cache.observe_valid(record, "login_token")
+                    record.set_token("app_token", app_token)
+                    renewed += 1
+                    logger.info("[续期] %s app_token续期成功", name)
+                else:
+                    logger.warning("[续期] %s app_token续期失败: %s", name, msg)
+            except Exception as e:
+                logger.warning("[续期] %s app_token续期异常: %s", name, e)
+    
+    return renewed
+
+
+# 登录路径（与 ZeppStepRunner.token_tier 取值一致）及说明
+LOGIN_PATHS = {
+    "app_token_cached": "app_token在有效期内，直接刷步数（不联网）",
+    "app_token_verified": "app_token临近过期或签发时间未知，先联网校验，失效时依次用 login_token / access_token / 密码刷新",
+    "login_token": "用login_token换取app_token",
+    "access_token": "用access_token换取login_token和app_token",
+    "password": "密码登录获取全部Token",
+}
+
+FRESHNESS_LABELS = {
+    FRESH: "有效",
+    NEAR_EXPIRY: "临近过期",
+    EXPIRED: "已过期或缺失",
+    UNKNOWN: "签发时间未知",
+}
+
+
+def predict_login_path(record: Optional[TokenRecord], token_cache: TokenCache) -> str:
+    """按缓存的签发时间（不联网）预测 ZeppStepRunner.login 的起点，返回 LOGIN_PATHS 的键"""
+    if record is None:
+        return "password"
+    if record.app_token:
+        if token_cache.freshness(record, "app_token") == FRESH:
+            return "app_token_cached"
+        return "app_token_verified"
+    if record.login_token:
+        return "login_token"
+    if record.access_token:
+        return "access_token"
+    return "password"
+
+
+def renew_due_tiers(record: Optional[TokenRecord], token_cache: TokenCache) -> List[str]:
+    """运行结束后 renew_user_tokens 会续期的Token层级"""
+    if record is None or not record.login_token:
+        return []
+    return [tier for tier in ("login_token", "app_token")
+            if token_cache.freshness(record, tier, margin=Config.TOKEN_RENEW_MARGIN) != FRESH]
+
+
 # ==================== 核心业务类 ====================
 
 class ZeppStepRunner:
     """Zepp刷步数执行器"""
     
-    def __init__(self, user: str, password: str, user_tokens: Dict):
+    def __init__(self, user: str, password: str, user_tokens: Dict[str, TokenRecord], client: HttpClient = None,
+                 token_cache: TokenCache = None, api: ApiConfig = None):
+        self.client = client or http_client.get_default_client()
+        self.api = api
+        self.deadline = self.client.deadline
+        self.retry_policy = self.client.retry_policy
+        self.report = self.client.report
+        # 本次登录实际使用的Token层级，写入运行报告
+        self.token_tier = None
+        self.token_cache = token_cache or TokenCache(Config.TOKEN_TTL, Config.TOKEN_REFRESH_MARGIN)
+        # 当前app_token是否未经联网校验（凭有效期直接使用）
+        self.token_unverified = False
         self.user_id = None
-        self.device_id = str(uuid.uuid4())
+        self.device_id = get_clock().uuid4()
         self.invalid = False
-        self.log_str = ""
         self.user_tokens = user_tokens
         self.error = None
         self.actual_step = 0
+        # 提交步数的次数（含业务失败重试和Token失效后重新登录的重试），写入运行报告
+        self.update_step_attempts = 0
         
         # 参数校验
         user = str(user).strip()
@@ -243,16 +429,26 @@ class ZeppStepRunner:
         self.password = password
         
         # 处理用户名格式
-        if not (user.startswith("+86") or "@" in user):
-            user = "+86" + user
+        user = normalize_user(user)
         
         self.is_phone = user.startswith("+86")
         self.user = user
         
         # 生成虚拟IP
         self.fake_ip_addr = fake_ip()
-        self.log_str += f"[虚拟IP] {self.fake_ip_addr}\n"
+        logger.info("[虚拟IP] %s", self.fake_ip_addr)
     
+    def _token_rejected(self) -> bool:
+        """
+        上一个请求是否明确拒绝了Token：200 但业务结果失败，或不可重试的4xx
+        5xx、429 和重试用尽的网络错误只说明服务暂时不可用，不能据此判定Token失效
+        """
+        status = self.client.last_status
+        if status is None:
+            return False
+        return status == 200 or (400 <= status < 500 and not self.retry_policy.is_retryable(status))
+    
+    @profiled("login")
     def login(self) -> Optional[str]:
         """
         登录并获取app_token
@@ -263,100 +459,119 @@ class ZeppStepRunner:
     
         # 尝试使用缓存的Token
         if user_token_info:
-            access_token = user_token_info.get("access_token")
-            login_token = user_token_info.get("login_token")
-            app_token = user_token_info.get("app_token")
-            self.device_id = user_token_info.get("device_id", self.device_id)
-            self.user_id = user_token_info.get("user_id")
+            access_token = user_token_info.access_token
+            login_token = user_token_info.login_token
+            app_token = user_token_info.app_token
+            self.device_id = user_token_info.device_id or self.device_id
+            self.user_id = user_token_info.user_id
     
-            # 检查app_token是否有效
-            try:
-                ok, msg = zeppHelper.check_app_token(app_token)
-                if ok:
-                    self.log_str += "[成功] 使用缓存的app_token\n"
-                    return app_token
-                # 添加详细日志
-                self.log_str += f"[详细] app_token验证失败: {msg}\n"
-            except Exception as e:
-                self.log_str += f"[警告] app_token验证异常: {str(e)}\n"
+            # app_token在有效期内直接使用，临近过期或无时间戳时才联网校验
+            app_state = self.token_cache.freshness(user_token_info, "app_token")
+            if app_state == FRESH:
+                self.token_unverified = True
+                logger.info("[成功] app_token未过期，直接使用缓存")
+                self.token_tier = "app_token_cached"
+                return app_token
+            
+            if app_token:
+                try:
+                    ok, msg = zeppHelper.check_app_token(app_token, client=self.client, api=self.api)
+                    if ok:
+                        self.token_cache.observe_valid(user_token_info, "app_token")
+                        logger.info("[成功] 使用缓存的app_token")
+                        self.token_tier = "app_token_verified"
+                        return app_token
+                    # 添加详细日志
+                    logger.debug("[详细] app_token验证失败: %s", msg)
+                    if self._token_rejected():
+                        self.token_cache.invalidate(user_token_info, "app_token")
+                except Exception as e:
+                    logger.warning("[警告] app_token验证异常: %s", e)
     
-            self.log_str += f"[警告] app_token已失效，尝试刷新...\n"
+            logger.warning("[警告] app_token已失效，尝试刷新...")
     
             # 尝试用login_token刷新app_token
             try:
-                app_token, msg = zeppHelper.grant_app_token(login_token)
+                app_token, msg = zeppHelper.grant_app_token(login_token, client=self.client, api=self.api)
                 if app_token:
-                    user_token_info["app_token"] = app_token
-                    user_token_info["app_token_time"] = get_timestamp()
-                    self.log_str += "[成功] 使用login_token刷新app_token\n"
+                    self.token_cache.observe_valid(user_token_info, "login_token")
+                    user_token_info.set_token("app_token", app_token)
+                    logger.info("[成功] 使用login_token刷新app_token")
+                    self.token_tier = "login_token"
                     return app_token
-                self.log_str += f"[详细] login_token刷新失败: {msg}\n"
+                logger.debug("[详细] login_token刷新失败: %s", msg)
+                if self._token_rejected():
+                    self.token_cache.invalidate(user_token_info, "login_token")
             except Exception as e:
-                self.log_str += f"[警告] login_token刷新异常: {str(e)}\n"
+                logger.warning("[警告] login_token刷新异常: %s", e)
     
-            self.log_str += f"[警告] login_token无效，尝试刷新...\n"
+            logger.warning("[警告] login_token无效，尝试刷新...")
     
             # 尝试用access_token刷新login_token
             try:
-                login_token, app_token, user_id, msg = zeppHelper.grant_login_tokens(access_token, self.device_id, self.is_phone)
+                login_token, app_token, user_id, msg = zeppHelper.grant_login_tokens(
+                    access_token, self.device_id, self.is_phone, client=self.client, api=self.api)
                 if login_token:
-                    user_token_info["login_token"] = login_token
-                    user_token_info["login_token_time"] = get_timestamp()
-                    user_token_info["app_token"] = app_token
-                    user_token_info["app_token_time"] = get_timestamp()
-                    user_token_info["user_id"] = user_id
+                    user_token_info.set_token("login_token", login_token)
+                    user_token_info.set_token("app_token", app_token, user_token_info.login_token_time)
+                    user_token_info.user_id = user_id
                     self.user_id = user_id
-                    self.log_str += "[成功] 使用access_token刷新login_token和app_token\n"
+                    logger.info("[成功] 使用access_token刷新login_token和app_token")
+                    self.token_tier = "access_token"
                     return app_token
-                self.log_str += f"[详细] access_token刷新失败: {msg}\n"
+                logger.debug("[详细] access_token刷新失败: %s", msg)
             except Exception as e:
-                self.log_str += f"[警告] access_token刷新异常: {str(e)}\n"
+                logger.warning("[警告] access_token刷新异常: %s", e)
     
-            self.log_str += f"[警告] access_token无效，重新登录...\n"
+            logger.warning("[警告] access_token无效，重新登录...")
     
         # 重新登录获取access_token
         try:
-            access_token, msg = zeppHelper.login_access_token(self.user, self.password)
+            access_token, msg = zeppHelper.login_access_token(self.user, self.password,
+                                                              client=self.client, api=self.api)
             if not access_token:
-                self.log_str += f"[失败] 获取access_token失败: {msg}\n"
+                logger.warning("[失败] 获取access_token失败: %s", msg)
                 self.error = f"登录失败: {msg}"
                 self.invalid = True
                 return None
-            self.log_str += "[成功] 重新登录获取access_token\n"
+            logger.info("[成功] 重新登录获取access_token")
         except Exception as e:
-            self.log_str += f"[异常] 登录异常: {str(e)}\n"
+            logger.error("[异常] 登录异常: %s", e)
             self.error = f"登录异常: {str(e)}"
             self.invalid = True
             return None
     
         # 使用access_token获取login_token等
         try:
-            login_token, app_token, user_id, msg = zeppHelper.grant_login_tokens(access_token, self.device_id, self.is_phone)
+            login_token, app_token, user_id, msg = zeppHelper.grant_login_tokens(
+                access_token, self.device_id, self.is_phone, client=self.client, api=self.api)
             if not login_token:
-                self.log_str += f"[失败] 获取login_token失败: {msg}\n"
+                logger.warning("[失败] 获取login_token失败: %s", msg)
                 self.error = f"获取login_token失败: {msg}"
                 self.invalid = True
                 return None
             
             self.user_id = user_id
-            self.user_tokens[self.user] = {
-                "access_token": access_token,
-                "access_token_time": get_timestamp(),
-                "login_token": login_token,
-                "login_token_time": get_timestamp(),
-                "app_token": app_token,
-                "app_token_time": get_timestamp(),
-                "user_id": user_id,
-                "device_id": self.device_id
-            }
-            self.log_str += "[成功] 登录成功，获取所有Token\n"
+            record = TokenRecord(user_id=user_id, device_id=self.device_id)
+            record.set_token("access_token", access_token)
+            record.set_token("login_token", login_token, record.access_token_time)
+            record.set_token("app_token", app_token, record.access_token_time)
+            previous = self.user_tokens.get(self.user)
+            if previous:
+                # 保留之前学习到的有效期（包括本次登录前刚由 invalidate 缩短的）
+                for tier in TOKEN_TIERS:
+                    record.set_learned_ttl(tier, previous.learned_ttl(tier))
+            self.user_tokens[self.user] = record
+            logger.info("[成功] 登录成功，获取所有Token")
+            self.token_tier = "password"
             return app_token
         except Exception as e:
-            self.log_str += f"[异常] 获取Token异常: {str(e)}\n"
+            logger.error("[异常] 获取Token异常: %s", e)
             self.error = f"获取Token异常: {str(e)}"
             self.invalid = True
             return None
     
+    @profiled("execute")
     def execute(self, min_step: int, max_step: int) -> Tuple[str, bool]:
         """
         执行刷步数主逻辑
@@ -365,29 +580,69 @@ class ZeppStepRunner:
         if self.invalid:
             return self.error, False
         
-        app_token = self.login()
+        try:
+            return self._execute(min_step, max_step)
+        except DeadlineExceeded as e:
+            logger.warning("[超时] %s，提前结束", e)
+            return "[超时] 运行时间预算已用尽", False
+        finally:
+            # 刷步数时缓存的app_token被拒绝会重新登录，报告以最终使用的层级为准
+            self.report.set("token_tier", self.token_tier)
+    
+    def _execute(self, min_step: int, max_step: int) -> Tuple[str, bool]:
+        with self.report.span("login"):
+            app_token = self.login()
         if not app_token:
             return self.error or "[失败] 登录失败", False
         
         # 生成随机步数
-        step = random.randint(min_step, max_step)
+        step = get_clock().rng.randint(min_step, max_step)
         self.actual_step = step
         
-        self.log_str += f"[随机步数] 范围: {min_step}~{max_step}，生成步数: {step}\n"
+        logger.info("[随机步数] 范围: %s~%s，生成步数: %s", min_step, max_step, step)
         
-        # 重试机制
-        for attempt in range(Config.MAX_RETRY):
+        with self.report.span("update_step") as span:
+            msg, ok = self._update_step_with_retry(app_token, step)
+            span["ok"] = ok
+        self.report.set("update_step_attempts", self.update_step_attempts)
+        return msg, ok
+    
+    def _update_step_with_retry(self, app_token: str, step: int) -> Tuple[str, bool]:
+        # 重试机制：网络抖动/5xx/429已由HTTP客户端按策略重试，
+        # 这里只重试服务端已受理但返回失败的情况，鉴权等错误直接放弃
+        last_attempt = self.retry_policy.max_attempts - 1
+        for attempt in range(self.retry_policy.max_attempts):
+            self.update_step_attempts += 1
             try:
-                ok, msg = zeppHelper.update_step(app_token, self.user_id, step, self.fake_ip_addr)
+                ok, msg = zeppHelper.update_step(app_token, self.user_id, step, self.fake_ip_addr,
+                                                client=self.client, api=self.api)
                 if ok:
                     return f"[成功] {msg} | 步数: {step}", True
-                self.log_str += f"[失败] 第{attempt+1}次尝试: {msg}\n"
+                logger.warning("[失败] 第%s次尝试: %s", attempt+1, msg)
+                retryable = self.client.last_status == 200
             except Exception as e:
-                self.log_str += f"[异常] 第{attempt+1}次尝试异常: {str(e)}\n"
+                msg = str(e)
+                logger.error("[异常] 第%s次尝试异常: %s", attempt+1, msg)
+                retryable = self.retry_policy.is_retryable(e)
             
-            if attempt < Config.MAX_RETRY - 1:
-                self.log_str += f"[重试] {Config.RETRY_DELAY}秒后重试...\n"
-                time.sleep(Config.RETRY_DELAY)
+            # 未经校验的app_token被服务端拒绝（非网络抖动类失败）：视为失效，走刷新流程后重试
+            status = self.client.last_status
+            if self.token_unverified and status is not None and not self.retry_policy.is_retryable(status):
+                self.token_unverified = False
+                self.token_cache.invalidate(self.user_tokens[self.user], "app_token")
+                logger.warning("[警告] 缓存的app_token可能已失效，刷新后重试...")
+                app_token = self.login()
+                if not app_token:
+                    return self.error or "[失败] 登录失败", False
+                continue
+            
+            if not retryable:
+                return f"[失败] {msg}（不可重试）", False
+            
+            if attempt < last_attempt:
+                delay = self.retry_policy.backoff(attempt)
+                logger.info("[重试] %.1f秒后重试...", delay)
+                self.deadline.sleep(delay)
         
         return "[失败] 达到最大重试次数", False
 
@@ -395,32 +650,28 @@ class ZeppStepRunner:
 # ==================== 主执行函数 ====================
 
 def run_single_account(user: str, password: str, 
-                      min_step: int, max_step: int, user_tokens: Dict) -> Dict:
+                      min_step: int, max_step: int, user_tokens: Dict[str, TokenRecord],
+                      client: HttpClient = None, api: ApiConfig = None) -> Dict:
     """
     执行单个账号的刷步数任务
     """
-    log_str = f"\n{'='*60}\n"
-    log_str += f"[时间] {format_now()}\n"
-    log_str += f"账号: {desensitize_user_name(user)}\n"
-    log_str += f"{'='*60}\n"
+    logger.info("\n%s\n[时间] %s\n账号: %s\n%s", '='*60, format_now(), desensitize_user_name(user), '='*60)
     
     try:
-        runner = ZeppStepRunner(user, password, user_tokens)
+        runner = ZeppStepRunner(user, password, user_tokens, client, api=api)
         exec_msg, success = runner.execute(min_step, max_step)
         
-        log_str += runner.log_str
-        log_str += f"{exec_msg}\n"
+        logger.log(logging.INFO if success else logging.WARNING, "%s", exec_msg)
         
         exec_result = {
             "user": desensitize_user_name(user),
             "success": success,
             "msg": exec_msg,
-            "step": runner.actual_step if success else None
+            "step": runner.actual_step if success else None,
+            "token_tier": runner.token_tier
         }
     except Exception as e:
-        error_msg = f"[异常] {str(e)}"
-        log_str += error_msg + "\n"
-        log_str += traceback.format_exc()
+        logger.error("[异常] %s", e, exc_info=True)
         
         exec_result = {
             "user": desensitize_user_name(user),
@@ -428,39 +679,23 @@ def run_single_account(user: str, password: str,
             "msg": f"执行异常: {str(e)}"
         }
     
-    print(log_str, flush=True)
     return exec_result
 
 
-def execute_all_accounts(users: str, passwords: str, min_step: int, max_step: int,
-                        user_tokens: Dict) -> List[Dict]:
-    """执行所有账号的刷步数任务（简化成单账号）"""
-    user_list = [u.strip() for u in users.split('#') if u.strip()]
-    passwd_list = [p.strip() for p in passwords.split('#') if p.strip()]
-    
-    if len(user_list) != len(passwd_list):
-        print(f"[错误] 账号数[{len(user_list)}]和密码数[{len(passwd_list)}]不匹配", flush=True)
-        return []
-    
+def execute_all_accounts(config: RuntimeConfig, min_step: int, max_step: int,
+                        user_tokens: Dict[str, TokenRecord], client: HttpClient = None) -> List[Dict]:
+    """执行所有账号的刷步数任务（简化成单账号；账号已在入口处校验）"""
     # 假设只用第一个账号
-    user = user_list[0]
-    passwd = passwd_list[0]
-    result = run_single_account(user, passwd, min_step, max_step, user_tokens)
+    user = config.users[0]
+    passwd = config.passwords[0]
+    result = run_single_account(user, passwd, min_step, max_step, user_tokens, client, config.api)
     return [result]
 
 
-def push_notification(exec_results: List[Dict], sckey: str = None):
-    """推送执行结果通知"""
-    if not sckey or sckey.upper() == 'NO':
-        print("[信息] 未配置推送或已禁用推送", flush=True)
-        return
-
-    if not exec_results:
-        return
-
+def format_notification(exec_results: List[Dict]) -> Tuple[str, str]:
+    """构建执行结果通知的标题和正文"""
     # 假设只有一个结果（您的代码只处理第一个账号）
     result = exec_results[0]
-    user = result.get('user', '未知')
     success = result.get('success', False)
     res_msg = result.get('msg', '无信息')
     step = result.get('step', 0) if success else None
@@ -468,103 +703,593 @@ def push_notification(exec_results: List[Dict], sckey: str = None):
     status = "成功 success" if success else "失败 failure"
     current_time = format_now()
 
-    # 构建推送标题和正文
     title = "刷步通知"
     body = f"{current_time}\n\n"
     if step:
         body += f"{status} | 步数: {step}\n"
     else:
         body += f"{status} | {res_msg}\n"
+    return title, body
+
+
+def build_notifier(config: RuntimeConfig, client: HttpClient) -> Optional[Notifier]:
+    """
+    按环境变量启用推送后端并加载待发队列，未配置任何后端时返回None
+    回放模式下队列只在内存中生效，不读写队列文件
+    """
+    backends = notifier.backends_from_env(client, config.sckey, config.api.endpoints["serverchan"])
+    if not backends:
+        return None
+    return notifier.Notifier.load(backends, None if config.replay else Config.NOTIFY_QUEUE_FILE,
+                                  max_queue=Config.NOTIFY_QUEUE_MAX, report=client.report)
+
+
+def load_user_tokens(config: RuntimeConfig, report: RunReport) -> Dict[str, TokenRecord]:
+    """加载Token缓存（计入 prepare_user_tokens 阶段），失败时返回空字典"""
+    try:
+        with report.span("prepare_user_tokens"):
+            return prepare_user_tokens(config, [normalize_user(u) for u in config.users])
+    except Exception as e:
+        logger.warning("[警告] Token加载失败: %s", e)
+        return {}
+
+
+def renew_phase(user_tokens: Dict[str, TokenRecord], client: HttpClient, api: ApiConfig = None):
+    """主流程结束后主动续期临近过期的Token，下次运行即可走缓存"""
+    if not user_tokens:
+        return
+    try:
+        with client.report.span("renew"):
+            renew_user_tokens(user_tokens, client, api=api)
+    except DeadlineExceeded:
+        logger.warning("[超时] 运行时间预算已用尽，跳过Token续期")
+    except Exception as e:
+        logger.warning("[警告] Token续期失败: %s", e)
+
+
+def persist_phase(config: RuntimeConfig, user_tokens: Dict[str, TokenRecord], report: RunReport):
+    """保存Token（无变化时不写入）"""
+    if not user_tokens:
+        return
+    try:
+        with report.span("persist_user_tokens"):
+            persist_user_tokens(config, user_tokens)
+    except Exception as e:
+        logger.warning("[警告] Token保存失败: %s", e)
 
-    print(f"[信息] 正在推送通知...", flush=True)
-    server_send(title, body, sckey)
+
+def is_notify_due(notify: Notifier, notify_hour: int) -> bool:
+    """到推送时刻，或队列中有待重试的消息"""
+    return get_beijing_time().hour == notify_hour or notify.has_retries
+
+
+def start_notification(notify: Notifier, exec_results: List[Dict], notify_hour: int):
+    """
+    推送通知：自动运行的结果先入队，到推送时刻（或有待重试的消息时）合并为一条摘要，
+    在后台发送，调用方随后可继续其他步骤，最后用 finish_notification 等待
+    """
+    if exec_results:
+        notify.enqueue(*format_notification(exec_results))
+    if is_notify_due(notify, notify_hour):
+        logger.info("[信息] 正在推送通知...")
+        notify.dispatch(Config.NOTIFY_TIMEOUT)
+
+
+def finish_notification(notify: Notifier):
+    notify.wait(Config.NOTIFY_TIMEOUT)
+    notify.save()
+
+
+def record_results(report: RunReport, exec_results: List[Dict]):
+    report.set("success", all(r.get('success') for r in exec_results))
+    report.set("total_steps", sum(r.get('step', 0) for r in exec_results if r.get('success')))
+
+
+def run_cycle(config: RuntimeConfig, user_tokens: Dict[str, TokenRecord],
+              client: HttpClient, persist: bool = True) -> List[Dict]:
+    """
+    一次完整的刷步数流程：执行 -> 主动续期 -> 保存Token（同时后台推送）
+    阶段耗时记入 client.report；执行阶段的异常由调用方处理
+    """
+    report = client.report
+    
+    # 计算步数范围
+    min_step, max_step = get_min_max_by_time()
+    logger.info("[信息] 步数范围: %s ~ %s", min_step, max_step)
+    
+    with report.span("execute"):
+        exec_results = execute_all_accounts(
+            config, min_step, max_step, 
+            user_tokens, client
+        )
+    
+    renew_phase(user_tokens, client, config.api)
+    
+    notify = build_notifier(config, client) if not config.manual_trigger else None
+    if notify:
+        start_notification(notify, exec_results, config.notify_hour)
+    if persist:
+        persist_phase(config, user_tokens, report)
+    if notify:
+        finish_notification(notify)
+    
+    record_results(report, exec_results)
+    return exec_results
+
+
+# ==================== 异步编排 ====================
+
+def warm_up_plan(config: RuntimeConfig, user_tokens: Dict[str, TokenRecord],
+                 notify: Notifier = None) -> Tuple[str, List[str]]:
+    """
+    按Token缓存状态预测本次运行要访问的接口
+    :param notify: 本次需要推送时传入，推送地址一并预热
+    :return: (第一个请求的地址, 之后才会用到的其他主机地址)；第一个请求自己建立连接即可
+    """
+    endpoints = config.api.endpoints
+    token_cache = TokenCache(Config.TOKEN_TTL, Config.TOKEN_REFRESH_MARGIN)
+    record = user_tokens.get(normalize_user(config.users[0])) if config.users else None
+    
+    later = []
+    path = predict_login_path(record, token_cache)
+    if path == "password":
+        first = endpoints["login"]
+        later.append(endpoints["client_login"])
+    else:
+        first = endpoints[{"app_token_cached": "band_data", "app_token_verified": "user_info",
+                           "login_token": "app_tokens", "access_token": "client_login"}[path]]
+    later.append(endpoints["band_data"])
+    
+    # 主流程之后的主动续期
+    renew_endpoints = {"login_token": "renew_login_token", "app_token": "app_tokens"}
+    later.extend(endpoints[renew_endpoints[tier]] for tier in renew_due_tiers(record, token_cache))
+    if notify:
+        later.extend(notify.warm_urls())
+    
+    # 每个主机预热一条连接即可（同一主机的请求依次进行）
+    hosts = {urllib.parse.urlsplit(first).netloc}
+    unique = []
+    for url in later:
+        host = urllib.parse.urlsplit(url).netloc
+        if host not in hosts:
+            hosts.add(host)
+            unique.append(url)
+    return first, unique
+
+
+async def run_cycle_async(config: RuntimeConfig, client: HttpClient, persist: bool = True) -> List[Dict]:
+    """
+    异步编排的刷步数流程：结果与 load_user_tokens + run_cycle 相同，但互不依赖的步骤相互重叠
+      - 解密Token缓存的同时预热 band_data 主机的连接
+      - 第一个请求进行时，预热之后的登录、续期、推送要访问的主机
+      - 推送通知与 主动续期 -> 保存Token 同时进行
+    各阶段在工作线程中计时，阶段名称与同步流程一致；执行阶段的异常由调用方处理
+    """
+    import asyncio
+    from util import zepp_async
+    
+    report = client.report
+    notify = build_notifier(config, client) if not config.manual_trigger else None
+    
+    band_url = config.api.endpoints["band_data"]
+    warm_band = asyncio.create_task(zepp_async.warm_up(client, band_url))
+    user_tokens = await asyncio.to_thread(load_user_tokens, config, report) if persist else {}
+    
+    notify_due = notify is not None and is_notify_due(notify, config.notify_hour)
+    first, later = warm_up_plan(config, user_tokens, notify if notify_due else None)
+    if first == band_url:
+        # 第一个请求就发往 band_data：等正在建立的连接，避免再建一条
+        await warm_band
+    warm_later = asyncio.create_task(zepp_async.warm_up(client, *[u for u in later if u != band_url]))
+    
+    min_step, max_step = get_min_max_by_time()
+    logger.info("[信息] 步数范围: %s ~ %s", min_step, max_step)
+    
+    def execute():
+        with report.span("execute"):
+            return execute_all_accounts(config, min_step, max_step, user_tokens, client)
+    
+    def renew_and_persist():
+        renew_phase(user_tokens, client, config.api)
+        if persist:
+            persist_phase(config, user_tokens, report)
+    
+    exec_results = await asyncio.to_thread(execute)
+    if notify:
+        start_notification(notify, exec_results, config.notify_hour)
+    await asyncio.to_thread(renew_and_persist)
+    if notify:
+        await asyncio.to_thread(finish_notification, notify)
+    await asyncio.gather(warm_band, warm_later)
+    
+    record_results(report, exec_results)
+    return exec_results
+
+
+def write_run_report(config: RuntimeConfig, report: RunReport):
+    """
+    输出阶段耗时摘要，写出JSON报告（设置 ZEPP_PROM_FILE 时同时写出Prometheus指标），
+    并追加一条运行历史；回放模式只输出摘要
+    """
+    logger.info("%s", report.summary())
+    if config.replay:
+        return
+    try:
+        report.write_json(Config.REPORT_FILE)
+        if config.prom_file:
+            report.write_prometheus(config.prom_file)
+    except OSError as e:
+        logger.warning("[警告] 运行报告写入失败: %s", e)
+    
+    from util.run_history import RunHistory, entry_from_report
+    try:
+        entry = entry_from_report(report, trigger='manual' if config.manual_trigger else 'auto')
+        RunHistory(Config.HISTORY_FILE, Config.HISTORY_MAX).append(entry)
+    except OSError as e:
+        logger.warning("[警告] 运行历史写入失败: %s", e)
 
 
 # ==================== 主入口 ====================
 
-def main():
-    """主函数 - 直接读取环境变量"""
-    print(f"\n{'='*60}", flush=True)
-    print(f"Zepp自动刷步数程序", flush=True)
-    print(f"执行时间: {format_now()}", flush=True)
-    print(f"触发方式: {'手动触发' if is_manual_trigger() else '自动触发'}", flush=True)
-    print(f"{'='*60}\n", flush=True)
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """解析命令行参数（账号等敏感配置仍从环境变量读取）"""
+    parser = argparse.ArgumentParser(description="Zepp自动刷步数程序")
+    parser.add_argument("--renew", action="store_true",
+                        help="仅续期缓存中临近过期的login_token/app_token，不刷步数")
+    parser.add_argument("--cassette", metavar="MODE:PATH", default=os.environ.get('ZEPP_CASSETTE'),
+                        help="HTTP录制/回放，如 record:run.json 或 replay:run.json（也可用环境变量 ZEPP_CASSETTE）")
+    parser.add_argument("--check", action="store_true",
+                        help="预检：离线报告Token缓存的新鲜度，仅在需要刷新时联网并写回缓存，不刷步数")
+    parser.add_argument("--migrate-tokens", action="store_true",
+                        help=f"将 {Config.TOKEN_FILE} 中的Token迁移到SQLite后端（{Config.TOKEN_DB}）")
+    parser.add_argument("--daemon", action="store_true",
+                        help="常驻运行，按 ZEPP_SCHEDULE（默认 %s）定时执行，SIGTERM 时保存后退出"
+                             % Config.DAEMON_SCHEDULE)
+    parser.add_argument("--profile", action="store_true",
+                        default=get_bool_value_default(os.environ.get('ZEPP_PROFILE'), False),
+                        help=f"按阶段采集 cProfile / tracemalloc 到 {Config.PROFILE_DIR}/ 并输出摘要（也可用环境变量 ZEPP_PROFILE）")
+    
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        default=get_bool_value_default(os.environ.get('ZEPP_ASYNC'), False),
+                        help="异步编排：Token解密与连接预热、推送与续期保存相互重叠（也可用环境变量 ZEPP_ASYNC）")
+    
+    subparsers = parser.add_subparsers(dest="command", metavar="命令")
+    history = subparsers.add_parser("history", help=f"查看运行历史（{Config.HISTORY_FILE}）",
+                                    description="查看最近的运行结果、Token刷新次数和各阶段耗时")
+    history.add_argument("--last", type=int, default=30, metavar="N", help="最近 N 次运行（默认 30，0 表示全部）")
+    history.add_argument("--p95", action="store_true", help="阶段耗时同时给出 p50 / p95")
+    return parser.parse_args(argv)
+
+
+def run_history(args: argparse.Namespace) -> int:
+    """history 子命令：输出运行历史统计，返回退出码"""
+    from util.run_history import RunHistory, format_history
+    
+    entries = RunHistory(Config.HISTORY_FILE, Config.HISTORY_MAX).load(max(args.last, 0))
+    logger.info("%s", format_history(entries, beijing_timezone(), percentiles=args.p95))
+    return 0
+
+
+def run_migrate(config: RuntimeConfig) -> int:
+    """迁移模式：加密文件 -> SQLite，返回退出码"""
+    if not os.path.exists(Config.TOKEN_FILE):
+        logger.info("[迁移] %s 不存在，无需迁移", Config.TOKEN_FILE)
+        return 0
+    backend = token_store.SqliteTokenBackend(Config.TOKEN_DB, config.aes_key)
+    try:
+        migrated = token_store.migrate_file_to_sqlite(Config.TOKEN_FILE, backend)
+    except Exception as e:
+        logger.error("[迁移] 失败: %s", e)
+        return 1
+    finally:
+        backend.close()
+    logger.info("[迁移] 已导入 %d 个账号的Token到 %s，设置环境变量 TOKEN_BACKEND=sqlite 即可启用",
+                migrated, Config.TOKEN_DB)
+    return 0
+
+
+def run_renew(config: RuntimeConfig, deadline: Deadline = None, cassette: Cassette = None) -> int:
+    """续期模式：加载缓存 -> 续期 -> 保存，返回退出码"""
+    logger.info("[续期] 开始主动续期Token（%s）", format_now())
+    user_tokens = prepare_user_tokens(config)
+    if not user_tokens:
+        logger.info("[续期] 没有可续期的Token缓存")
+        return 0
+    
+    client = build_client(config, deadline, cassette=cassette)
+    try:
+        renewed = renew_user_tokens(user_tokens, client, api=config.api)
+    except DeadlineExceeded as e:
+        logger.warning("[超时] %s，续期中止", e)
+        return 1
+    finally:
+        client.breaker.save()
+        if cassette:
+            cassette.save()
+        client.close()
+    
+    logger.info("[续期] 共续期 %s 个Token", renewed)
+    saved = persist_user_tokens(config, user_tokens) if renewed else True
+    close_token_backend()
+    return 0 if saved else 1
+
+
+def log_token_freshness(record: Optional[TokenRecord], token_cache: TokenCache):
+    """逐层输出Token新鲜度（按缓存中的签发时间计算，不联网）"""
+    for tier in TOKEN_TIERS:
+        state = token_cache.freshness(record, tier)
+        # 不用 "tier: 值" 的写法，避免被日志脱敏规则当作Token遮盖
+        line = f"  - {tier} {FRESHNESS_LABELS[state]}"
+        age = record.age(tier) if record is not None and record.token(tier) else None
+        if age is not None:
+            ttl = token_cache.ttl(record, tier)
+            line += "（已用 %.1f 小时 / 有效期 %.1f 小时%s）" % (
+                age / 3600, ttl / 3600, "，学习值" if record.learned_ttl(tier) else "")
+        logger.info("%s", line)
+
+
+def run_check(config: RuntimeConfig, deadline: Deadline = None, cassette: Cassette = None) -> int:
+    """
+    预检模式：解密Token缓存并离线报告各层Token的新鲜度，只在需要刷新时联网，
+    修复后的Token写回缓存，不刷步数；输出下次正式运行将走的登录路径
+    :return: 退出码，缓存无法解密或无法取得app_token时为1
+    """
+    logger.info("[检查] 开始预检Token缓存（%s）", format_now())
+    if not config.aes_key_configured:
+        logger.warning("[警告] 未设置有效的AES_KEY，Token缓存使用默认密钥")
+    
+    store = get_token_backend(config)
+    user = normalize_user(config.users[0])
+    try:
+        if store.name == "file" and not os.path.exists(Config.TOKEN_FILE):
+            logger.info("[检查] Token缓存文件不存在")
+            user_tokens = {}
+        else:
+            user_tokens = store.load([user])
+            logger.info("[成功] Token缓存解密成功（%s 个账号）", len(user_tokens))
+    except Exception as e:
+        # 不重置存储：密钥错误时正式运行会整体重写缓存，这里只报告
+        logger.error("[失败] Token缓存解密失败（AES_KEY 可能有误）: %s", e)
+        close_token_backend()
+        return 1
+    
+    token_cache = TokenCache(Config.TOKEN_TTL, Config.TOKEN_REFRESH_MARGIN)
+    record = user_tokens.get(user)
+    if record is None and store.count():
+        # 记录ID由账号和AES_KEY派生，更换密钥后原有记录无法定位
+        logger.warning("[警告] 缓存中有 %s 条记录，但没有与当前账号和AES_KEY对应的记录（AES_KEY 是否更换过？）",
+                       store.count())
+    logger.info("[检查] 账号 %s 的Token状态:", desensitize_user_name(user))
+    log_token_freshness(record, token_cache)
+    path = predict_login_path(record, token_cache)
+    logger.info("[检查] 当前登录路径: %s（%s）", path, LOGIN_PATHS[path])
+    
+    client = build_client(config, deadline, cassette=cassette)
+    try:
+        # 只有缓存的app_token不能直接使用时才联网，登录流程与正式运行相同
+        if path != "app_token_cached":
+            runner = ZeppStepRunner(user, config.passwords[0], user_tokens, client, token_cache, config.api)
+            if runner.invalid or not runner.login():
+                logger.error("[失败] Token刷新失败: %s", runner.error)
+                return 1
+            logger.info("[检查] 实际刷新路径: %s（%s）", runner.token_tier, LOGIN_PATHS[runner.token_tier])
+        renewed = renew_user_tokens(user_tokens, client, token_cache, config.api)
+        if renewed:
+            logger.info("[检查] 已续期 %s 个Token", renewed)
+        saved = persist_user_tokens(config, user_tokens)
+    except DeadlineExceeded as e:
+        logger.warning("[超时] %s，预检中止", e)
+        return 1
+    finally:
+        close_token_backend()
+        client.breaker.save()
+        if cassette:
+            cassette.save()
+        logger.info("[检查] 联网请求 %s 次", client.stats()['requests'])
+        client.close()
+    
+    record = user_tokens.get(user)
+    next_path = predict_login_path(record, token_cache)
+    logger.info("[检查] 下次运行路径: %s（%s）", next_path, LOGIN_PATHS[next_path])
+    renew = renew_due_tiers(record, token_cache)
+    if renew:
+        logger.info("[检查] 下次运行结束后将续期: %s", "、".join(renew))
+    return 0 if saved else 1
+
+
+# ==================== 守护模式 ====================
+
+def parse_schedule(value: str) -> List[Tuple[int, int]]:
+    """解析 'HH:MM,HH:MM' 形式的每日运行时间（北京时间），按时间排序"""
+    schedule = set()
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        hour, _, minute = item.partition(':')
+        hour, minute = int(hour), int(minute or 0)
+        if not (0 <= hour <= 23 and 0 <= minute <= 59):
+            raise ValueError(f"无效的运行时间: {item}")
+        schedule.add((hour, minute))
+    if not schedule:
+        raise ValueError("运行时间表为空")
+    return sorted(schedule)
+
+
+def next_run_time(schedule: List[Tuple[int, int]], now: datetime) -> datetime:
+    """计算下一次运行时间：今天尚未到达的最早时间点，否则为明天的第一个"""
+    for hour, minute in schedule:
+        candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if candidate > now:
+            return candidate
+    hour, minute = schedule[0]
+    tomorrow = now + timedelta(days=1)
+    return tomorrow.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+
+def run_daemon(config: RuntimeConfig, cassette: Cassette = None) -> int:
+    """
+    守护模式：解密后的Token、HTTP连接池、熔断状态和请求体模板常驻内存，
+    按时间表触发与定时任务相同的流程；Token只在变化时写盘，收到 SIGTERM/SIGINT 后
+    等待当前运行结束、保存状态再退出
+    """
+    try:
+        schedule = parse_schedule(config.schedule)
+    except ValueError as e:
+        logger.error("[错误] ZEPP_SCHEDULE 无效: %s", e)
+        return 1
+    stop = threading.Event()
+    
+    def handle_signal(signum, frame):
+        logger.info("\n[守护] 收到信号 %s，当前运行结束后退出", signal.Signals(signum).name)
+        stop.set()
+    
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    
+    user_tokens = prepare_user_tokens(config, [normalize_user(u) for u in config.users])
+    client = build_client(config, None, RunReport(), cassette)
+    logger.info("[守护] 已启动，运行时间: %s", ", ".join("%02d:%02d" % t for t in schedule))
+    
+    try:
+        while not stop.is_set():
+            run_at = next_run_time(schedule, get_beijing_time())
+            logger.info("[守护] 下次运行: %s", run_at.strftime('%Y-%m-%d %H:%M'))
+            # 分段等待，系统休眠或校时后也能按墙钟时间触发
+            while not stop.is_set():
+                remaining = (run_at - get_beijing_time()).total_seconds()
+                if remaining <= 0:
+                    break
+                stop.wait(min(remaining, Config.DAEMON_POLL))
+            if stop.is_set():
+                break
+            
+            # 每次运行独立的时间预算和运行报告，连接池和熔断状态沿用
+            client.deadline = Deadline(config.run_deadline)
+            client.report = RunReport()
+            logger.info("\n[守护] 开始运行（%s）", format_now())
+            try:
+                run_cycle(config, user_tokens, client)
+            except Exception as e:
+                logger.error("[错误] 执行过程中发生异常: %s", e, exc_info=True)
+            client.breaker.save()
+            write_run_report(config, client.report)
+    finally:
+        # 退出前补写未保存的变化（无变化时不写盘）
+        if user_tokens:
+            persist_user_tokens(config, user_tokens)
+        close_token_backend()
+        client.breaker.save()
+        if cassette:
+            cassette.save()
+        client.close()
+        logger.info("[守护] 已退出")
+    return 0
+
+
+def main(argv: List[str] = None):
+    """主函数：解析参数并构建本次运行的配置（环境变量只在这里读取一次）"""
+    args = parse_args(argv)
+    setup_logging()
+    config = build_runtime_config(args)
+    if not config.profile:
+        run(args, config)
+        return
+    start_profiling(Config.PROFILE_DIR, config.profile_top)
+    try:
+        run(args, config)
+    finally:
+        stop_profiling()
+
+
+def run(args: argparse.Namespace, config: RuntimeConfig):
+    """单次运行（或按参数进入续期/迁移/守护模式、查询历史），以 sys.exit 结束"""
+    if args.command == "history":
+        sys.exit(run_history(args))
+    deadline = Deadline(config.run_deadline)
+    
+    # 接口地址重定向（本地模拟服务/离线基准测试）
+    if config.api_base:
+        logger.info("[信息] 接口地址已重定向至 %s", config.api_base)
+    
+    from util.cassette import Cassette
+    cassette = Cassette.from_env(config.cassette)
+    if cassette:
+        logger.info("[信息] HTTP%s模式: %s", '回放' if cassette.replaying else '录制', cassette.path)
+    
+    if args.migrate_tokens:
+        sys.exit(run_migrate(config))
+    if args.renew:
+        sys.exit(run_renew(config, deadline, cassette))
     
-    # 直接读取环境变量
-    users = os.environ.get('ZEPP_USER', '').strip()
-    passwords = os.environ.get('ZEPP_PWD', '').strip()
-    sckey = os.environ.get('SCKEY', '').strip()
+    logger.info("\n%s", '='*60)
+    logger.info("Zepp自动刷步数程序")
+    logger.info("执行时间: %s", format_now())
+    logger.info("触发方式: %s", '手动触发' if config.manual_trigger else '自动触发')
+    logger.info("%s\n", '='*60)
     
     # 验证必需参数
-    print("[检查] 环境变量配置...", flush=True)
-    print(f"  - USER存在: {bool(users)}", flush=True)
-    print(f"  - PWD存在: {bool(passwords)}", flush=True)
-    print(f"  - SCKEY存在: {bool(sckey)}", flush=True)
-    print(f"  - AES_KEY存在: {bool(os.environ.get('AES_KEY'))}\n", flush=True)
-    
-    if not users or not passwords:
-        print("[错误] 缺少必需的环境变量: USER 或 PWD", flush=True)
+    logger.info("[检查] 环境变量配置...")
+    logger.info("  - USER存在: %s", bool(config.users))
+    logger.info("  - PWD存在: %s", bool(config.passwords))
+    logger.info("  - SCKEY存在: %s", bool(config.sckey))
+    logger.info("  - AES_KEY存在: %s\n", config.aes_key_configured)
+    
+    # 验证账号密码（非空且数量一致）
+    try:
+        config.check_accounts()
+    except ConfigError as e:
+        logger.error("[错误] %s", e)
         sys.exit(1)
     
-    # 验证账号密码数量
-    user_list = [u.strip() for u in users.split('#') if u.strip()]
-    passwd_list = [p.strip() for p in passwords.split('#') if p.strip()]
+    logger.info("[成功] 配置验证通过（%s 个账号）\n", len(config.users))
     
-    if len(user_list) != len(passwd_list):
-        print(f"[错误] 账号数量({len(user_list)})与密码数量({len(passwd_list)})不匹配", flush=True)
-        sys.exit(1)
+    if args.check:
+        sys.exit(run_check(config, deadline, cassette))
+    if args.daemon:
+        sys.exit(run_daemon(config, cassette))
     
-    print(f"[成功] 配置验证通过（{len(user_list)} 个账号）\n", flush=True)
+    report = RunReport()
     
-    # 加载Token缓存
-    user_tokens = {}
-    aes_key = get_aes_key()
+    if not config.aes_key_configured:
+        logger.warning("[警告] 未设置AES_KEY，Token缓存使用默认密钥加密")
     
-    if aes_key:
-        try:
-            user_tokens = prepare_user_tokens()
-        except Exception as e:
-            print(f"[警告] Token加载失败: {str(e)}", flush=True)
-            user_tokens = {}
-    else:
-        print("[警告] 未设置AES_KEY，无法使用Token缓存功能", flush=True)
+    notify_channels = [b.label for b in notifier.backends_from_env(None, config.sckey,
+                                                                   config.api.endpoints["serverchan"])]
+    logger.info("[信息] 推送通知: %s\n", '已启用（%s）' % '、'.join(notify_channels) if notify_channels else '未启用')
     
-    # 计算步数范围
-    min_step, max_step = get_min_max_by_time()
-    print(f"[信息] 步数范围: {min_step} ~ {max_step}", flush=True)
-    print(f"[信息] 推送通知: {'已启用' if sckey and sckey != 'NO' else '未启用'}\n", flush=True)
+    # 所有请求共用一个连接池客户端
+    client = build_client(config, deadline, report, cassette)
     
-    # 执行刷步数
+    # 执行刷步数（异步编排时Token加载与连接预热同时进行）
     try:
-        exec_results = execute_all_accounts(
-            users, passwords, min_step, max_step, 
-            user_tokens
-        )
+        if config.use_async:
+            import asyncio
+            exec_results = asyncio.run(run_cycle_async(config, client))
+        else:
+            user_tokens = load_user_tokens(config, report)
+            exec_results = run_cycle(config, user_tokens, client)
     except Exception as e:
-        print(f"\n[错误] 执行过程中发生异常: {str(e)}", flush=True)
-        traceback.print_exc()
+        logger.error("\n[错误] 执行过程中发生异常: %s", e, exc_info=True)
         sys.exit(1)
-    
-    # 保存Token
-    if aes_key and user_tokens:
-        try:
-            persist_user_tokens(user_tokens)
-        except Exception as e:
-            print(f"[警告] Token保存失败: {str(e)}", flush=True)
+    finally:
+        close_token_backend()
     
     # 统计结果
-    total = len(exec_results)
-    success_count = sum(1 for r in exec_results if r.get('success'))
-    fail_count = total - success_count
-    total_steps = sum(r.get('step', 0) for r in exec_results if r.get('success'))
+    fail_count = sum(1 for r in exec_results if not r.get('success'))
     
+    logger.info("[信息] 运行耗时 %.1f 秒（预算 %s 秒）", deadline.elapsed(), deadline.budget)
+    client.breaker.save()
+    if cassette:
+        cassette.save()
+    conn_stats = client.stats()
+    logger.info("[信息] HTTP连接: 请求 %s 次，新建 %s，复用 %s",
+                conn_stats['requests'], conn_stats['opened'], conn_stats['reused'])
+    client.close()
     
-    # 推送通知：只在自动运行且当前小时为19时推送
-    if sckey and sckey.upper() != 'NO' and not is_manual_trigger() and get_beijing_time().hour == 19:
-        try:
-            push_notification(exec_results, sckey)
-        except Exception as e:
-            print(f"[警告] 推送通知失败: {str(e)}", flush=True)
+    # 写出运行报告
+    report.set("connections", conn_stats)
+    write_run_report(config, report)
     
     # 返回退出码
     sys.exit(0 if fail_count == 0 else 1)
@@ -1,30 +1,24 @@
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
-import os
+
+from util.config import DEFAULT_AES_KEY  # noqa: F401  兼容旧的导入位置
 
 # 华米传输加密使用的密钥 固定iv
 # 参考自 https://github.com/hanximeng/Zepp_API/blob/main/index.php
 HM_AES_KEY = b'xeNtBVqzDc6tuNTh'  # 16 bytes
 HM_AES_IV = b'MAAAYAAAAAAAAABg'  # 16 bytes
 
-# 本地存储默认密钥（可自定义）
-DEFAULT_AES_KEY = b'xeNtBVqzDc6tuNTh'  # 16 bytes，请修改为你的密钥
-
 AES_BLOCK_SIZE = AES.block_size  # 16
 
 
-def get_aes_key():
-    """获取AES密钥：优先使用环境变量，否则使用默认密钥"""
-    aes_key = os.environ.get('AES_KEY')
-    if aes_key and len(aes_key) == 16:
-        return aes_key.encode('utf-8')
-    return DEFAULT_AES_KEY
+# 接受的字节类输入
+BytesLike = (bytes, bytearray, memoryview)
 
 
-def _pkcs7_pad(data: bytes) -> bytes:
+def _pkcs7_pad(data) -> bytes:
     """PKCS7填充"""
     pad_len = AES_BLOCK_SIZE - (len(data) % AES_BLOCK_SIZE)
-    return data + bytes([pad_len]) * pad_len
+    return bytes(data) + bytes((pad_len,)) * pad_len
 
 
 def _pkcs7_unpad(data: bytes) -> bytes:
@@ -41,18 +35,35 @@ def _pkcs7_unpad(data: bytes) -> bytes:
 
 def _validate_key(key: bytes):
     """验证密钥格式"""
-    if not isinstance(key, (bytes, bytearray)):
+    if not isinstance(key, BytesLike):
         raise TypeError("key must be bytes")
     if len(key) != 16:
         raise ValueError("key must be 16 bytes for AES-128")
 
 
+def _validate_iv(iv: bytes):
+    if len(iv) != AES_BLOCK_SIZE:
+        raise ValueError(f"IV must be {AES_BLOCK_SIZE} bytes")
+
+
+def _encrypt(plain, key: bytes, iv: bytes) -> bytes:
+    """CBC加密（CBC对象带有链式状态，不能跨消息复用，每条消息必须新建）"""
+    return AES.new(key, AES.MODE_CBC, iv).encrypt(_pkcs7_pad(plain))
+
+
+def _decrypt(ciphertext, key: bytes, iv) -> bytes:
+    if len(ciphertext) == 0 or len(ciphertext) % AES_BLOCK_SIZE != 0:
+        raise ValueError("invalid ciphertext length")
+    decrypted_padded = AES.new(key, AES.MODE_CBC, iv).decrypt(ciphertext)
+    return _pkcs7_unpad(decrypted_padded)
+
+
 def encrypt_data(plain: bytes, key: bytes, iv: bytes | None = None) -> bytes:
     """
     AES-CBC加密
     
     参数：
-      - plain: 明文字节
+      - plain: 明文（bytes / bytearray / memoryview）
       - key: 16 字节 AES-128 密钥
       - iv: IV向量，如果为None则生成随机IV并附加在密文前
     
@@ -61,24 +72,16 @@ def encrypt_data(plain: bytes, key: bytes, iv: bytes | None = None) -> bytes:
       - iv不为None时: ciphertext（使用固定IV）
     """
     _validate_key(key)
-    if not isinstance(plain, (bytes, bytearray)):
+    if not isinstance(plain, BytesLike):
         raise TypeError("plain must be bytes")
 
     if iv is None:
         # 使用随机IV
         iv = get_random_bytes(AES_BLOCK_SIZE)
-        cipher = AES.new(key, AES.MODE_CBC, iv)
-        padded = _pkcs7_pad(plain)
-        ciphertext = cipher.encrypt(padded)
-        return iv + ciphertext  # IV + 密文
-    else:
-        # 使用固定IV
-        if len(iv) != AES_BLOCK_SIZE:
-            raise ValueError(f"IV must be {AES_BLOCK_SIZE} bytes")
-        cipher = AES.new(key, AES.MODE_CBC, iv)
-        padded = _pkcs7_pad(plain)
-        ciphertext = cipher.encrypt(padded)
-        return ciphertext  # 仅密文
+        return iv + _encrypt(plain, key, iv)  # IV + 密文
+    # 使用固定IV
+    _validate_iv(iv)
+    return _encrypt(plain, key, iv)
 
 
 def decrypt_data(data: bytes, key: bytes, iv: bytes | None = None) -> bytes:
@@ -86,45 +89,32 @@ def decrypt_data(data: bytes, key: bytes, iv: bytes | None = None) -> bytes:
     AES-CBC解密
     
     参数：
-      - data: 加密数据（IV + 密文 或 仅密文）
+      - data: 加密数据（IV + 密文 或 仅密文），bytes / bytearray / memoryview
       - key: 16 字节 AES-128 密钥
       - iv: 固定IV，如果为None则从data前16字节提取
     
     返回：明文字节
     """
     _validate_key(key)
-    if not isinstance(data, (bytes, bytearray)):
+    if not isinstance(data, BytesLike):
         raise TypeError("data must be bytes")
 
     if iv is None:
         # 从数据中提取IV（前16字节）
         if len(data) < AES_BLOCK_SIZE:
             raise ValueError("data too short")
-        
-        iv = data[:AES_BLOCK_SIZE]
-        ciphertext = data[AES_BLOCK_SIZE:]
-        
-        if len(ciphertext) == 0 or len(ciphertext) % AES_BLOCK_SIZE != 0:
-            raise ValueError("invalid ciphertext length")
-    else:
-        # 使用提供的固定IV
-        if len(iv) != AES_BLOCK_SIZE:
-            raise ValueError(f"IV must be {AES_BLOCK_SIZE} bytes")
-        ciphertext = data
-        if len(ciphertext) == 0 or len(ciphertext) % AES_BLOCK_SIZE != 0:
-            raise ValueError("invalid ciphertext length")
-
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    decrypted_padded = cipher.decrypt(ciphertext)
-    return _pkcs7_unpad(decrypted_padded)
+        return _decrypt(data[AES_BLOCK_SIZE:], key, bytes(data[:AES_BLOCK_SIZE]))
+    # 使用提供的固定IV
+    _validate_iv(iv)
+    return _decrypt(data, key, iv)
 
 
-# 华米API专用加密函数（使用固定密钥和IV）
+# 华米API专用加密函数（使用固定密钥和IV，常量无需逐次校验）
 def encrypt_huami_data(plain: bytes) -> bytes:
     """使用华米固定密钥和IV加密数据"""
-    return encrypt_data(plain, HM_AES_KEY, HM_AES_IV)
+    return _encrypt(plain, HM_AES_KEY, HM_AES_IV)
 
 
 def decrypt_huami_data(data: bytes) -> bytes:
     """使用华米固定密钥和IV解密数据"""
-    return decrypt_data(data, HM_AES_KEY, HM_AES_IV)
+    return _decrypt(data, HM_AES_KEY, HM_AES_IV)
@@ -0,0 +1,159 @@
+"""
+HTTP录制/回放（cassette）
+录制模式下把真实请求的响应脱敏后保存到文件；回放模式下不访问网络，
+按 (方法, 路径) 的顺序返回录制的响应，用于离线复现解析和加密路径的性能剖析。
+
+启用方式：环境变量 ZEPP_CASSETTE=record:文件路径 或 replay:文件路径
+"""
+import json
+import re
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from util.log import get_logger
+
+logger = get_logger(__name__)
+
+RECORD = "record"
+REPLAY = "replay"
+
+CASSETTE_VERSION = 1
+
+# 需要脱敏的字段（请求参数、请求头、响应JSON中的键）
+SECRET_KEYS = frozenset({
+    "access_token", "login_token", "app_token", "apptoken", "user_id", "userid",
+    "password", "emailorphone", "x-forwarded-for",
+})
+
+# 响应头中只保留回放需要的字段
+KEEP_HEADERS = ("Content-Type", "Location", "Retry-After")
+
+_LOCATION_SECRET = re.compile(r"(?<=access=)[^&]*")
+
+
+class CassetteMiss(requests.exceptions.RequestException):
+    """回放时没有匹配的录制响应"""
+
+
+class Cassette:
+    """
+    录制/回放器
+    :param path: cassette 文件路径
+    :param mode: RECORD 或 REPLAY
+    """
+
+    def __init__(self, path: str, mode: str):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"未知的cassette模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self.interactions: List[Dict] = []
+        # 真实敏感值 -> 占位符，同一个值在整盘录制中保持一致
+        self._placeholders: Dict[str, str] = {}
+        self._queues: Dict[Tuple[str, str], Deque[Dict]] = defaultdict(deque)
+        if mode == REPLAY:
+            self._load()
+
+    @classmethod
+    def from_env(cls, value: Optional[str]) -> Optional["Cassette"]:
+        """解析 'record:路径' / 'replay:路径' 形式的配置，未配置时返回None"""
+        if not value:
+            return None
+        mode, sep, path = value.partition(":")
+        if not sep or not path:
+            raise ValueError("ZEPP_CASSETTE 格式应为 record:路径 或 replay:路径")
+        return cls(path, mode.strip().lower())
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    # ---------- 脱敏 ----------
+
+    def _placeholder(self, value) -> str:
+        value = str(value)
+        if value not in self._placeholders:
+            self._placeholders[value] = f"REDACTED-{len(self._placeholders) + 1}"
+        return self._placeholders[value]
+
+    def _redact(self, obj):
+        if isinstance(obj, dict):
+            return {k: self._placeholder(v) if k.lower() in SECRET_KEYS and v not in (None, "")
+                    else self._redact(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self._redact(v) for v in obj]
+        return obj
+
+    def _redact_body(self, content: bytes) -> str:
+        text = content.decode("utf-8", errors="replace")
+        try:
+            return json.dumps(self._redact(json.loads(text)), ensure_ascii=False)
+        except ValueError:
+            return text
+
+    # ---------- 录制 ----------
+
+    @staticmethod
+    def _key(method: str, url: str, path_label: str = None) -> Tuple[str, str]:
+        """匹配键：路径含密钥的请求（推送）使用调用方给出的脱敏路径，录制和回放一致"""
+        return method.upper(), path_label or urlsplit(url).path
+
+    def record(self, method: str, url: str, response: requests.Response, path_label: str = None):
+        parts = urlsplit(url)
+        query = self._redact(dict(parse_qsl(parts.query)))
+        headers = {}
+        for name in KEEP_HEADERS:
+            value = response.headers.get(name)
+            if value is not None:
+                if name == "Location":
+                    value = _LOCATION_SECRET.sub(lambda m: self._placeholder(m.group(0)), value)
+                headers[name] = value
+        self.interactions.append({
+            "request": {"method": method.upper(), "host": parts.netloc,
+                        "path": self._key(method, url, path_label)[1], "query": query},
+            "response": {"status": response.status_code, "headers": headers,
+                         "body": self._redact_body(response.content)},
+        })
+
+    def save(self):
+        if self.mode != RECORD:
+            return
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"version": CASSETTE_VERSION, "interactions": self.interactions},
+                      f, ensure_ascii=False, indent=2)
+        logger.info("[录制] 已保存 %d 条HTTP交互到 %s", len(self.interactions), self.path)
+
+    # ---------- 回放 ----------
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"不支持的cassette版本: {data.get('version')}")
+        self.interactions = data["interactions"]
+        for interaction in self.interactions:
+            request = interaction["request"]
+            self._queues[(request["method"], request["path"])].append(interaction["response"])
+
+    def play(self, method: str, url: str, path_label: str = None, **kwargs) -> requests.Response:
+        """取出下一条匹配的录制响应；同一接口的最后一条响应会被重复使用"""
+        key = self._key(method, url, path_label)
+        queue = self._queues.get(key)
+        if not queue:
+            raise CassetteMiss(f"cassette中没有 {method} {key[1]} 的录制")
+        recorded = queue.popleft() if len(queue) > 1 else queue[0]
+
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.headers = CaseInsensitiveDict(recorded["headers"])
+        response._content = recorded["body"].encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = url
+        response.request = requests.Request(
+            method, url, params=kwargs.get("params"), data=kwargs.get("data"),
+            headers=kwargs.get("headers")).prepare()
+        return response
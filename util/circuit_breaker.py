@@ -0,0 +1,115 @@
+"""
+按主机的熔断器
+某主机连续失败达到阈值后熔断，冷却期内的后续运行直接跳过该主机；
+冷却期满后只放行一次探测请求，成功则恢复，失败则继续熔断。
+状态保存在Token缓存旁的JSON文件中，跨运行生效。
+"""
+import json
+import os
+from typing import Dict, List, Tuple
+
+from requests.exceptions import RequestException
+
+from util.clock import get_clock
+from util.log import get_logger
+
+logger = get_logger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RequestException):
+    """主机处于熔断状态，请求未发出"""
+
+
+class CircuitBreaker:
+    """
+    熔断器
+    :param path: 状态文件路径，None 表示仅在内存中生效
+    :param failure_threshold: 连续失败多少次后熔断
+    :param cooldown: 熔断后多少秒允许探测
+    """
+
+    def __init__(self, path: str = None, failure_threshold: int = 3, cooldown: float = 1800):
+        self.path = path
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.hosts: Dict[str, Dict] = {}
+        self.transitions: List[Tuple[str, str, str]] = []
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "CircuitBreaker":
+        breaker = cls(path, **kwargs)
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    breaker.hosts = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("[警告] 熔断状态文件读取失败，已重置: %s", e)
+        for host, entry in breaker.hosts.items():
+            if entry.get("state") != CLOSED:
+                logger.info("[熔断] %s: 当前状态 %s（连续失败 %s 次）", host, entry.get('state'), entry.get('failures', 0))
+        return breaker
+
+    def save(self):
+        if not self.path or not self._dirty:
+            return
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.hosts, f, ensure_ascii=False)
+            self._dirty = False
+        except OSError as e:
+            logger.warning("[警告] 熔断状态保存失败: %s", e)
+
+    def state(self, host: str) -> str:
+        return self.hosts.get(host, {}).get("state", CLOSED)
+
+    def _entry(self, host: str) -> Dict:
+        return self.hosts.setdefault(host, {"state": CLOSED, "failures": 0, "opened_at": 0})
+
+    def _transition(self, host: str, entry: Dict, new_state: str):
+        old_state = entry["state"]
+        if old_state == new_state:
+            return
+        entry["state"] = new_state
+        if new_state == OPEN:
+            entry["opened_at"] = get_clock().time()
+        self.transitions.append((host, old_state, new_state))
+        self._dirty = True
+        logger.warning("[熔断] %s: %s -> %s", host, old_state, new_state)
+
+    def before_request(self, host: str):
+        """
+        请求前检查：熔断中且未到冷却期直接抛出 CircuitOpenError，
+        冷却期满转为半开放行一次探测
+        """
+        entry = self.hosts.get(host)
+        if not entry or entry["state"] == CLOSED:
+            return
+        if entry["state"] == OPEN:
+            wait = entry.get("opened_at", 0) + self.cooldown - get_clock().time()
+            if wait > 0:
+                raise CircuitOpenError(f"{host} 已熔断，{wait:.0f} 秒后允许探测")
+            self._transition(host, entry, HALF_OPEN)
+
+    def is_probing(self, host: str) -> bool:
+        return self.state(host) == HALF_OPEN
+
+    def record_success(self, host: str):
+        entry = self.hosts.get(host)
+        if not entry:
+            return
+        if entry["failures"]:
+            entry["failures"] = 0
+            self._dirty = True
+        self._transition(host, entry, CLOSED)
+
+    def record_failure(self, host: str):
+        entry = self._entry(host)
+        entry["failures"] = entry.get("failures", 0) + 1
+        self._dirty = True
+        if entry["state"] == HALF_OPEN or entry["failures"] >= self.failure_threshold:
+            self._transition(host, entry, OPEN)
@@ -0,0 +1,131 @@
+"""
+时钟、随机数与等待
+所有模块通过 get_clock() 读取当前时间、生成随机数/UUID、等待，不直接调用 time / random / uuid：
+  - Clock         真实时钟（默认）
+  - VirtualClock  虚拟时钟：sleep 立即返回并推进时间，随机数固定种子，
+                  基准测试和测试中退避等待不再真的等待，结果可以精确重复
+耗时测量（time.perf_counter）不经过这里，始终反映真实墙钟
+"""
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Optional
+
+
+@lru_cache(maxsize=None)
+def beijing_timezone() -> tzinfo:
+    """北京时区（首次调用时加载，之后复用）；系统缺少时区数据时退回固定UTC+8"""
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo('Asia/Shanghai')
+    except Exception:
+        return timezone(timedelta(hours=8), 'Asia/Shanghai')
+
+
+class Clock:
+    """
+    真实时钟
+    :param seed: 随机数种子，None 表示不固定
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+
+    def time(self) -> float:
+        """墙钟时间（Unix秒）"""
+        return time.time()
+
+    def monotonic(self) -> float:
+        """单调时钟（秒），用于截止时间和超时计算"""
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def now(self, tz: tzinfo = None) -> datetime:
+        """当前时间，tz 为 None 时为本地时间"""
+        return datetime.fromtimestamp(self.time(), tz)
+
+    def now_ms(self) -> int:
+        return int(self.time() * 1000)
+
+    def uuid4(self) -> str:
+        """随机UUID（由本时钟的随机数生成，固定种子时可重复）"""
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+
+class VirtualClock(Clock):
+    """
+    虚拟时钟：只有 sleep / advance 会推进时间
+    :param start: 起始墙钟时间（Unix秒），默认取创建时的真实时间
+    :param seed: 随机数种子（默认0，保证可重复）
+    """
+
+    def __init__(self, start: float = None, seed: Optional[int] = 0):
+        super().__init__(seed)
+        self._now = time.time() if start is None else start
+        self._monotonic = 0.0
+        self._lock = threading.Lock()
+        # 累计"等待"的秒数，便于基准输出被省去的退避时间
+        self.slept = 0.0
+
+    def time(self) -> float:
+        return self._now
+
+    def monotonic(self) -> float:
+        return self._monotonic
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            with self._lock:
+                self.slept += seconds
+            self.advance(seconds)
+
+    def advance(self, seconds: float):
+        with self._lock:
+            self._now += seconds
+            self._monotonic += seconds
+
+
+_clock: Clock = Clock()
+
+
+def get_clock() -> Clock:
+    return _clock
+
+
+def set_clock(clock: Clock) -> Clock:
+    """替换全局时钟，返回原来的时钟"""
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
+
+
+@contextmanager
+def use_clock(clock: Clock):
+    """在 with 块内使用指定时钟，退出时恢复"""
+    previous = set_clock(clock)
+    try:
+        yield clock
+    finally:
+        set_clock(previous)
+
+
+def get_beijing_time() -> datetime:
+    """获取北京时间"""
+    return _clock.now(beijing_timezone())
+
+
+def format_now() -> str:
+    """格式化当前时间（北京时间）"""
+    return get_beijing_time().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def now_ms() -> int:
+    """当前时间戳（毫秒）"""
+    return _clock.now_ms()
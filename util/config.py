@@ -0,0 +1,155 @@
+"""
+运行时配置
+每次运行开始时由环境变量和命令行参数构建一次，之后作为不可变对象向下传递：
+账号、密钥、接口地址、超时、重试参数和各接口的固定请求头都在这里确定，
+热路径上的函数不再重复读取环境变量或重建请求头字典
+配置类型为 NamedTuple（启动路径不引入 dataclasses，见 benchmarks/bench_startup.py）
+"""
+import urllib.parse
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional, Tuple
+
+# Token本地存储的默认密钥（未设置 AES_KEY 时使用）
+DEFAULT_AES_KEY = b'xeNtBVqzDc6tuNTh'  # 16 bytes，请修改为你的密钥
+
+# 各接口的默认地址（含Server酱推送，{key} 为SendKey）；ZEPP_API_BASE 可将它们统一指向本地模拟服务
+DEFAULT_ENDPOINTS = {
+    "login": "https://api-user.zepp.com/v2/registrations/tokens",
+    "client_login": "https://account.huami.com/v2/client/login",
+    "app_tokens": "https://account-cn.huami.com/v1/client/app_tokens",
+    "user_info": "https://api-mifit-cn3.zepp.com/huami.health.getUserInfo.json",
+    "renew_login_token": "https://account-cn3.zepp.com/v1/client/renew_login_token",
+    "band_data": "https://api-mifit-cn.huami.com/v1/data/band_data.json",
+    "serverchan": "https://sctapi.ftqq.com/{key}.send",
+}
+
+APP_VERSION = "6.14.0"
+APP_CV = "50818_6.14.0"
+ANDROID_UA = f"MiFit{APP_VERSION} (M2007J1SC; Android 12; Density/2.75)"
+
+# 各接口的固定请求头（x-request-id、apptoken 等每次请求不同的字段由调用方补充）
+HEADER_PRESETS = {
+    "login": {
+        "content-type": "application/x-www-form-urlencoded; charset=UTF-8",
+        "user-agent": ANDROID_UA,
+        "app_name": "com.xiaomi.hm.health",
+        "appname": "com.xiaomi.hm.health",
+        "appplatform": "android_phone",
+        "x-hm-ekv": "1",
+        "hm-privacy-ceip": "false",
+    },
+    "client_login": {
+        "app_name": "com.xiaomi.hm.health",
+        "accept-language": "zh-CN",
+        "appname": "com.xiaomi.hm.health",
+        "cv": APP_CV,
+        "v": "2.0",
+        "appplatform": "android_phone",
+        "content-type": "application/x-www-form-urlencoded; charset=UTF-8",
+    },
+    "app_tokens": {
+        "User-Agent": "MiFit/5.3.0 (iPhone; iOS 14.7.1; Scale/3.00)",
+    },
+    "user_info": {
+        "User-Agent": ANDROID_UA,
+        "Accept-Encoding": "gzip",
+        "hm-privacy-diagnostics": "false",
+        "country": "CN",
+        "appplatform": "android_phone",
+        "hm-privacy-ceip": "true",
+        "timezone": "Asia/Shanghai",
+        "channel": "Normal",
+        "cv": APP_CV,
+        "appname": "com.xiaomi.hm.health",
+        "v": "2.0",
+        "lang": "zh_CN",
+        "clientid": "428135909242707968",
+    },
+    "renew_login_token": {
+        "User-Agent": ANDROID_UA,
+        "Accept-Encoding": "gzip",
+        "app_name": "com.xiaomi.hm.health",
+        "hm-privacy-ceip": "false",
+        "accept-language": "zh-CN",
+        "appname": "com.xiaomi.hm.health",
+        "cv": APP_CV,
+        "v": "2.0",
+        "appplatform": "android_phone",
+    },
+    "band_data": {
+        "Content-Type": "application/x-www-form-urlencoded",
+    },
+}
+
+
+class ConfigError(ValueError):
+    """配置无效（如账号与密码数量不一致）"""
+
+
+def with_api_base(endpoints: Mapping[str, str], base_url: str) -> dict:
+    """将各接口的协议和主机替换为 base_url（保留路径）"""
+    base = urllib.parse.urlsplit(base_url)
+    result = {}
+    for name, url in endpoints.items():
+        parts = urllib.parse.urlsplit(url)
+        result[name] = urllib.parse.urlunsplit((base.scheme, base.netloc, parts.path, "", ""))
+    return result
+
+
+def parse_aes_key(value: Optional[str]) -> Optional[bytes]:
+    """解析 AES_KEY：16个字符时返回字节串，未设置或长度不对时返回None"""
+    if value and len(value) == 16:
+        return value.encode("utf-8")
+    return None
+
+
+def split_accounts(value: str) -> Tuple[str, ...]:
+    """拆分以 # 分隔的多个账号/密码"""
+    return tuple(item.strip() for item in value.split('#') if item.strip())
+
+
+class ApiConfig(NamedTuple):
+    """接口配置：Zepp/华米 及推送接口的地址、超时和固定请求头"""
+    endpoints: Mapping[str, str]
+    timeout: float          # 登录、Token类接口的超时（秒）
+    step_timeout: float     # 提交步数的超时（秒）
+    headers: Mapping[str, Mapping[str, str]]
+
+    @classmethod
+    def build(cls, api_base: str = None, timeout: float = 10, step_timeout: float = 30) -> "ApiConfig":
+        endpoints = with_api_base(DEFAULT_ENDPOINTS, api_base) if api_base else dict(DEFAULT_ENDPOINTS)
+        headers = {name: MappingProxyType(dict(preset)) for name, preset in HEADER_PRESETS.items()}
+        return cls(MappingProxyType(endpoints), timeout, step_timeout, MappingProxyType(headers))
+
+
+class RuntimeConfig(NamedTuple):
+    """单次运行（或守护进程）的全部运行时配置，构建后不再变化"""
+    users: Tuple[str, ...]
+    passwords: Tuple[str, ...]
+    sckey: str
+    aes_key: bytes                 # Token存储密钥（未设置 AES_KEY 时为默认密钥）
+    aes_key_configured: bool       # 是否通过 AES_KEY 设置了有效密钥
+    api: ApiConfig
+    api_base: str                  # 接口重定向地址（ZEPP_API_BASE），空表示真实服务
+    request_timeout: float         # HTTP客户端默认超时（秒）
+    run_deadline: float            # 整次运行的时间预算（秒）
+    retry_attempts: int            # 含首次在内的最大尝试次数
+    retry_delay: float             # 指数退避基数（秒）
+    retry_max_delay: float         # 单次退避上限（秒）
+    token_backend: str             # Token存储后端：file / sqlite
+    notify_hour: int               # 推送时刻（北京时间小时）
+    manual_trigger: bool           # 是否为手动触发（workflow_dispatch）
+    schedule: str                  # 守护模式每日运行时间
+    prom_file: str                 # Prometheus textfile 路径，空表示不写
+    cassette: Optional[str]        # HTTP录制/回放（MODE:PATH）
+    replay: bool                   # 回放模式：不写Token缓存、通知队列、运行报告和历史
+    profile: bool
+    profile_top: int
+    use_async: bool
+
+    def check_accounts(self):
+        """校验账号和密码：都不能为空且数量一致，否则抛出 ConfigError"""
+        if not self.users or not self.passwords:
+            raise ConfigError("缺少必需的环境变量: USER 或 PWD")
+        if len(self.users) != len(self.passwords):
+            raise ConfigError(f"账号数量({len(self.users)})与密码数量({len(self.passwords)})不匹配")
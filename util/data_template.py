@@ -0,0 +1,86 @@
+"""
+band_data 请求体模板
+一次性解析 DATA_JSON，把日期和总步数切成具名槽位，填充时只做一次 join
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+# 槽位定位规则：与旧版 update_step 中的正则保持一致，但只在解析时执行一次
+SLOT_PATTERNS = {
+    "date": re.compile(r"date%22%3A%22(.*?)%22%2C%22data"),
+    "step": re.compile(r"ttl%5C%22%3A(.*?)%2C%5C%22dis"),
+}
+
+
+class PayloadTemplate:
+    """
+    预编译的请求体模板
+
+    segments 为固定文本与槽位名交替排列的列表，填充时直接替换槽位后 join，
+    不会对原始数据做任何全串替换。
+    """
+
+    __slots__ = ("_segments", "_slot_index", "defaults")
+
+    def __init__(self, source: str, patterns: Dict[str, "re.Pattern"] = None):
+        patterns = patterns or SLOT_PATTERNS
+        spans: List[Tuple[int, int, str]] = []
+        self.defaults: Dict[str, str] = {}
+        for name, pattern in patterns.items():
+            match = pattern.search(source)
+            if match is None:
+                raise ValueError(f"模板中未找到槽位: {name}")
+            spans.append((match.start(1), match.end(1), name))
+            self.defaults[name] = match.group(1)
+        spans.sort()
+
+        segments: List[str] = []
+        slot_index: Dict[str, int] = {}
+        pos = 0
+        for start, end, name in spans:
+            if start < pos:
+                raise ValueError(f"槽位重叠: {name}")
+            segments.append(source[pos:start])
+            slot_index[name] = len(segments)
+            segments.append(self.defaults[name])
+            pos = end
+        segments.append(source[pos:])
+
+        self._segments = segments
+        self._slot_index = slot_index
+
+    @property
+    def slots(self) -> Tuple[str, ...]:
+        return tuple(self._slot_index)
+
+    def fill(self, prefix: str = "", **values) -> str:
+        """
+        填充槽位并返回完整字符串
+        :param prefix: 拼接在模板前的固定文本（如表单的其它字段），与模板一起 join
+        :param values: 槽位名 -> 值，未提供的槽位使用原始数据中的默认值
+        """
+        parts = list(self._segments)
+        for name, value in values.items():
+            parts[self._slot_index[name]] = str(value)
+        if prefix:
+            parts.insert(0, prefix)
+        return "".join(parts)
+
+
+_band_data_template: Optional[PayloadTemplate] = None
+
+
+def get_band_data_template() -> PayloadTemplate:
+    """获取 band_data 模板（首次调用时解析并缓存）"""
+    global _band_data_template
+    if _band_data_template is None:
+        # DATA_JSON 约15KB，只在真正构造请求体时加载
+        from util.constants import DATA_JSON
+        _band_data_template = PayloadTemplate(DATA_JSON)
+    return _band_data_template
+
+
+def build_band_data(userid, date: str, step: int) -> str:
+    """构造 band_data.json 的表单请求体"""
+    prefix = f'userid={userid}&last_sync_data_time=1597306380&device_type=0&last_deviceid=DA932FFFFE8816E7&data_json='
+    return get_band_data_template().fill(prefix, date=date, step=step)
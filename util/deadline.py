@@ -0,0 +1,59 @@
+"""
+运行时间预算
+整个运行共用一个截止时间，所有HTTP请求超时和重试等待都从剩余预算中扣除
+"""
+import math
+from typing import Optional
+
+from util.clock import get_clock
+
+
+class DeadlineExceeded(BaseException):
+    """
+    运行时间预算已用尽
+
+    与 asyncio.CancelledError 一样继承 BaseException，
+    避免被各业务函数中的 `except Exception` 吞掉，保证能一路中止到入口处。
+    """
+
+
+class Deadline:
+    """
+    截止时间
+    :param budget: 总预算（秒），None 表示不限制
+    """
+
+    def __init__(self, budget: Optional[float] = None):
+        self.budget = budget
+        self._start = get_clock().monotonic()
+        self._end = math.inf if budget is None else self._start + budget
+
+    def remaining(self) -> float:
+        return self._end - get_clock().monotonic()
+
+    def elapsed(self) -> float:
+        return get_clock().monotonic() - self._start
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self):
+        if self.expired:
+            raise DeadlineExceeded(f"运行时间超过预算 {self.budget} 秒")
+
+    def timeout(self, cap: Optional[float] = None) -> Optional[float]:
+        """
+        本次调用可用的超时时间：不超过 cap，也不超过剩余预算
+        """
+        self.check()
+        remaining = self.remaining()
+        if cap is None:
+            return None if math.isinf(remaining) else remaining
+        return min(cap, remaining)
+
+    def sleep(self, seconds: float):
+        """在预算内等待；等待后必然超出预算时直接中止，不再空等"""
+        if seconds >= self.remaining():
+            raise DeadlineExceeded(f"剩余预算不足以等待 {seconds:.1f} 秒")
+        get_clock().sleep(seconds)
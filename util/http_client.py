@@ -0,0 +1,205 @@
+"""
+共享HTTP客户端
+每个主机一个保持连接的Session，统一连接池大小、默认请求头和gzip，
+按重试策略处理网络抖动，按主机熔断，并统计连接复用情况
+"""
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from util.cassette import Cassette
+from util.circuit_breaker import CircuitBreaker
+from util.deadline import Deadline
+from util.retry import RetryPolicy, parse_retry_after
+from util.run_report import RunReport
+
+DEFAULT_HEADERS = {
+    "Accept-Encoding": "gzip",
+    "Connection": "keep-alive",
+}
+
+
+class HttpClient:
+    """按主机复用连接的HTTP客户端"""
+
+    def __init__(self, pool_maxsize: int = 4, default_headers: Dict[str, str] = None,
+                 timeout: float = 30, deadline: Deadline = None,
+                 retry_policy: RetryPolicy = None, breaker: CircuitBreaker = None,
+                 report: RunReport = None, cassette: Cassette = None):
+        self.pool_maxsize = pool_maxsize
+        self.default_headers = dict(DEFAULT_HEADERS)
+        if default_headers:
+            self.default_headers.update(default_headers)
+        self.timeout = timeout
+        self.deadline = deadline or Deadline()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker
+        self.report = report or RunReport()
+        # 录制/回放：回放时不发出真实请求
+        self.cassette = cassette
+        # 最近一次请求的HTTP状态码（请求异常时为None），供调用方判断失败类型
+        self.last_status: Optional[int] = None
+        self._sessions: Dict[str, requests.Session] = {}
+        # 预热连接在后台线程中进行，Session 的创建需要加锁
+        self._lock = threading.Lock()
+
+    def session_for(self, url: str) -> requests.Session:
+        """获取（或创建）目标主机的Session"""
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = requests.Session()
+                    session.headers.update(self.default_headers)
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                    session.mount(host, adapter)
+                    self._sessions[host] = session
+        return session
+
+    def warm_up(self, url: str, timeout: float = 5) -> bool:
+        """
+        提前建立到目标主机的连接（TCP + TLS）并放回连接池，之后的请求直接复用
+        尽力而为：回放、熔断、走代理或连接失败时跳过
+        :return: 是否已建立连接
+        """
+        if self.cassette and self.cassette.replaying:
+            return False
+        host = urlsplit(url).netloc
+        if self.breaker and self.breaker.state(host) != "closed":
+            return False
+        session = self.session_for(url)
+        # 与实际请求一样合并环境变量中的 CA证书/代理 设置，才能命中同一个连接池
+        settings = session.merge_environment_settings(url, {}, None, None, None)
+        if settings["proxies"]:
+            return False
+        adapter = session.get_adapter(url)
+        pool = adapter.get_connection_with_tls_context(
+            requests.Request("GET", url).prepare(), settings["verify"], cert=settings["cert"])
+        # urllib3 没有公开"取出/归还连接"的接口；内部方法不存在时直接跳过预热
+        if not (hasattr(pool, "_get_conn") and hasattr(pool, "_put_conn")):
+            return False
+        conn = pool._get_conn()
+        try:
+            if conn.sock is None:
+                conn.timeout = self.deadline.timeout(timeout)
+                conn.connect()
+            return True
+        except Exception:
+            conn.close()
+            return False
+        finally:
+            pool._put_conn(conn)
+
+    def request(self, method: str, url: str, path_label: str = None, **kwargs) -> requests.Response:
+        """
+        发送请求：超时、连接错误、5xx、429按重试策略退避重试，其余响应直接返回
+        重试次数用尽时返回最后一次响应或抛出最后一次异常
+        :param path_label: 运行报告中代替真实路径的标签，路径中含密钥（如Server酱SendKey）时使用
+        """
+        parts = urlsplit(url)
+        host = parts.netloc
+        endpoint = f"{host}{path_label or parts.path}"
+        self.last_status = None
+        if self.breaker:
+            # 熔断中直接抛出 CircuitOpenError；半开状态只探测一次，不重试
+            self.breaker.before_request(host)
+        probing = self.breaker is not None and self.breaker.is_probing(host)
+        
+        session = self.session_for(url)
+        cap = kwargs.pop("timeout", self.timeout)
+        policy = self.retry_policy
+        last_attempt = 0 if probing else policy.max_attempts - 1
+        
+        for attempt in range(last_attempt + 1):
+            self.last_status = None
+            # 单次超时不超过剩余运行预算，预算耗尽时抛出 DeadlineExceeded
+            timeout = self.deadline.timeout(cap)
+            start = time.perf_counter()
+            try:
+                if self.cassette and self.cassette.replaying:
+                    response = self.cassette.play(method, url, path_label, **kwargs)
+                else:
+                    response = session.request(method, url, timeout=timeout, **kwargs)
+                    if self.cassette:
+                        self.cassette.record(method, url, response, path_label)
+            except Exception as e:
+                self.report.record_http(method, endpoint, None, time.perf_counter() - start,
+                                        attempt=attempt, error=type(e).__name__)
+                retryable = policy.is_retryable(e)
+                if attempt == last_attempt or not retryable:
+                    if retryable and self.breaker:
+                        self.breaker.record_failure(host)
+                    raise
+                self.deadline.sleep(policy.backoff(attempt))
+                continue
+            
+            self.last_status = response.status_code
+            body = response.request.body
+            self.report.record_http(method, endpoint, response.status_code, time.perf_counter() - start,
+                                    bytes_sent=len(body) if body else 0,
+                                    bytes_received=len(response.content), attempt=attempt)
+            retryable = policy.is_retryable(response.status_code)
+            if attempt == last_attempt or not retryable:
+                if self.breaker:
+                    if retryable:
+                        self.breaker.record_failure(host)
+                    else:
+                        self.breaker.record_success(host)
+                return response
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            response.close()
+            self.deadline.sleep(policy.backoff(attempt, retry_after))
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        连接统计
+        :return: {"hosts": 主机数, "requests": 请求数, "opened": 新建连接数, "reused": 复用连接次数}
+        """
+        opened = 0
+        total = 0
+        for session in self._sessions.values():
+            for adapter in session.adapters.values():
+                pools = getattr(getattr(adapter, "poolmanager", None), "pools", None)
+                if pools is None:
+                    continue
+                for key in list(pools.keys()):
+                    pool = pools.get(key)
+                    if pool is None:
+                        continue
+                    opened += pool.num_connections
+                    total += pool.num_requests
+        return {
+            "hosts": len(self._sessions),
+            "requests": total,
+            "opened": opened,
+            "reused": max(total - opened, 0),
+        }
+
+    def close(self):
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+
+
+_default_client: Optional[HttpClient] = None
+
+
+def get_default_client() -> HttpClient:
+    """进程级默认客户端（未显式传入client时使用）"""
+    global _default_client
+    if _default_client is None:
+        _default_client = HttpClient()
+    return _default_client
@@ -0,0 +1,27 @@
+"""
+延迟导入
+每次定时运行都是冷启动的新进程，requests / pycryptodome 等模块的导入开销
+只应在真正访问网络或加解密时支付；--help、参数错误等路径无需加载
+"""
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    返回延迟加载的模块：首次访问其属性时才真正执行模块代码
+    已导入的模块直接返回
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
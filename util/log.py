@@ -0,0 +1,104 @@
+"""
+分级日志
+基于标准库 logging，统一输出到标准输出（Actions 日志），消息保持原有的 "[标签] 内容" 格式。
+  - 使用 %s 占位符传参，级别未开启时不做任何格式化；昂贵的序列化用 lazy_json 包装
+  - 输出前统一脱敏：Token、密码、账号等键值以及运行中登记的敏感值替换为 ***
+
+级别由环境变量 LOG_LEVEL 控制（DEBUG / INFO / WARNING / ERROR，默认 INFO）
+"""
+import json
+import logging
+import os
+import re
+import sys
+from typing import Optional, Set
+
+ROOT_LOGGER = "zepp"
+
+# 需要脱敏的键（URL参数、表单、JSON、请求头）
+SECRET_KEYS = ("access_token", "login_token", "app_token", "apptoken", "access", "password", "code",
+               "emailorphone", "userid", "user_id")
+
+_SECRET_PAIR = re.compile(
+    r"""(?P<key>(?<![\w-])["']?(?:%s)["']?\s*[:=]\s*["']?)(?P<value>[^"'&,;\s}]+)""" % "|".join(SECRET_KEYS),
+    re.IGNORECASE)
+
+# 运行中登记的敏感值（如刚签发的Token），出现在任意位置都会被替换
+_secrets: Set[str] = set()
+
+MASK = "***"
+
+
+def register_secret(value: Optional[str]):
+    """登记敏感值，之后的日志中出现该值时替换为 ***（过短的值不登记，避免误伤）"""
+    if value and len(str(value)) >= 8:
+        _secrets.add(str(value))
+
+
+def redact(text: str) -> str:
+    """脱敏：键值对形式的敏感字段 + 已登记的敏感值"""
+    text = _SECRET_PAIR.sub(lambda m: m.group("key") + MASK, text)
+    for secret in _secrets:
+        if secret in text:
+            text = text.replace(secret, MASK)
+    return text
+
+
+class lazy_json:
+    """延迟序列化：只有日志真正输出时才调用 json.dumps"""
+
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        try:
+            return json.dumps(self.obj, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return repr(self.obj)
+
+
+class RedactingFormatter(logging.Formatter):
+    """格式化后统一脱敏（只在记录实际输出时执行）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return redact(super().format(record))
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """始终写入当前的 sys.stdout（兼容 contextlib.redirect_stdout）"""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def get_logger(name: str = None) -> logging.Logger:
+    """获取项目日志器（zepp 命名空间下，统一由 setup_logging 配置）"""
+    if not name or name == "__main__":
+        return logging.getLogger(ROOT_LOGGER)
+    return logging.getLogger(f"{ROOT_LOGGER}.{name.rsplit('.', 1)[-1]}")
+
+
+def setup_logging(level: str = None) -> logging.Logger:
+    """
+    配置输出级别和格式，可重复调用
+    :param level: 日志级别名称，默认读取环境变量 LOG_LEVEL
+    """
+    level = (level or os.environ.get("LOG_LEVEL") or "INFO").strip().upper()
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(getattr(logging, level, logging.INFO))
+    if not any(isinstance(h, _StdoutHandler) for h in logger.handlers):
+        handler = _StdoutHandler()
+        handler.setFormatter(RedactingFormatter("%(message)s"))
+        logger.addHandler(handler)
+    logger.propagate = False
+    return logger
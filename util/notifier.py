@@ -0,0 +1,332 @@
+"""
+推送通知
+可插拔的推送后端（Server酱 / 通用Webhook / SMTP邮件），与Token保存并行发送：
+  - 每次运行的结果先进入队列，到推送时间再合并为一条摘要发出
+  - 各后端在独立线程中同时发送，总等待时间有上限，不拖住运行结束
+  - 失败或超时未确认的消息保存到队列文件，下次运行重试；
+    每条消息按后端记录待发状态，某个后端失败不会让其他后端重复推送
+"""
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+from util.clock import get_clock
+from util.config import DEFAULT_ENDPOINTS
+from util.deadline import DeadlineExceeded
+from util.log import get_logger, register_secret
+from util.run_report import RunReport
+
+logger = get_logger(__name__)
+
+# 摘要中各条消息之间的分隔（Server酱正文为Markdown）
+DIGEST_SEPARATOR = "\n\n---\n\n"
+
+
+class NotifyError(Exception):
+    """推送失败（消息保留在队列中，下次运行重试）"""
+
+
+class Message:
+    """
+    队列中的一条通知
+    :param pending: 尚未成功发送的后端名称
+    :param attempts: 已失败的发送次数
+    """
+
+    __slots__ = ("title", "body", "created", "pending", "attempts")
+
+    def __init__(self, title: str, body: str, created: float = None,
+                 pending: Sequence[str] = (), attempts: int = 0):
+        self.title = title
+        self.body = body
+        self.created = get_clock().time() if created is None else created
+        self.pending = set(pending)
+        self.attempts = attempts
+
+    def to_dict(self) -> Dict:
+        return {"title": self.title, "body": self.body, "created": self.created,
+                "pending": sorted(self.pending), "attempts": self.attempts}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Message":
+        return cls(data.get("title", ""), data.get("body", ""), data.get("created"),
+                   data.get("pending", ()), data.get("attempts", 0))
+
+
+# ==================== 推送后端 ====================
+
+class NotifierBackend:
+    """推送后端基类：send 成功直接返回，失败抛出异常"""
+
+    name = "base"    # 队列中记录待发状态使用的标识
+    label = "推送"   # 日志中显示的名称
+
+    # 需要预热连接的地址（非HTTP后端为None）
+    url: Optional[str] = None
+
+    # 运行报告中代替真实路径的标签（路径中含密钥，不能原样写入报告）
+    path_label: Optional[str] = None
+
+    def send(self, title: str, body: str, timeout: float):
+        raise NotImplementedError
+
+
+class ServerChanBackend(NotifierBackend):
+    """
+    Server酱推送（支持Server酱Turbo）
+    :param url_template: 接口地址模板，{key} 替换为SendKey，默认为官方地址
+    """
+
+    name = "serverchan"
+    label = "Server酱"
+
+    def __init__(self, sckey: str, client, url_template: str = None):
+        self.sckey = sckey
+        self.client = client
+        template = url_template or DEFAULT_ENDPOINTS["serverchan"]
+        self.url = template.format(key=sckey)
+        self.path_label = urlsplit(template).path.format(key="***")
+        register_secret(sckey)
+
+    def send(self, title: str, body: str, timeout: float):
+        response = self.client.post(self.url, data={'text': title, 'desp': body}, timeout=timeout,
+                                    path_label=self.path_label)
+        if response.status_code != 200:
+            raise NotifyError(f"HTTP {response.status_code}")
+        result = response.json()
+        if result.get('code') != 0:
+            raise NotifyError(result.get('message') or '未知错误')
+
+
+class WebhookBackend(NotifierBackend):
+    """通用Webhook：POST JSON {"title", "body", "text"}，2xx 视为成功"""
+
+    name = "webhook"
+    label = "Webhook"
+
+    # Webhook地址的路径常带有令牌，报告中整体隐藏
+    path_label = "/***"
+
+    def __init__(self, url: str, client):
+        self.url = url
+        self.client = client
+
+    def send(self, title: str, body: str, timeout: float):
+        payload = {"title": title, "body": body, "text": f"{title}\n\n{body}"}
+        response = self.client.post(self.url, json=payload, timeout=timeout, path_label=self.path_label)
+        if not 200 <= response.status_code < 300:
+            raise NotifyError(f"HTTP {response.status_code}")
+
+
+class SmtpBackend(NotifierBackend):
+    """
+    SMTP邮件推送
+    端口465使用SSL，其余端口在服务器支持时升级STARTTLS
+    """
+
+    name = "smtp"
+    label = "邮件"
+
+    def __init__(self, host: str, port: int, sender: str, recipients: List[str],
+                 user: str = None, password: str = None):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients
+        self.user = user
+        self.password = password
+        register_secret(password)
+
+    def send(self, title: str, body: str, timeout: float):
+        import smtplib
+        from email.message import EmailMessage
+
+        message = EmailMessage()
+        message["Subject"] = title
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        message.set_content(body)
+
+        if self.port == 465:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=timeout)
+        with server:
+            if self.port != 465:
+                server.ehlo()
+                if server.has_extn("starttls"):
+                    server.starttls()
+            if self.user:
+                server.login(self.user, self.password or "")
+            server.send_message(message)
+
+
+def backends_from_env(client, sckey: str = None, serverchan_url: str = None) -> List[NotifierBackend]:
+    """
+    按环境变量启用推送后端
+    :param serverchan_url: Server酱接口地址模板（取自运行配置），None 为官方地址
+      - SCKEY                          Server酱（NO 表示禁用）
+      - NOTIFY_WEBHOOK                 Webhook地址
+      - SMTP_HOST / SMTP_PORT / SMTP_USER / SMTP_PASSWORD / SMTP_FROM / SMTP_TO（逗号分隔）
+    """
+    backends: List[NotifierBackend] = []
+    sckey = sckey if sckey is not None else os.environ.get('SCKEY', '').strip()
+    if sckey and sckey.upper() != 'NO':
+        backends.append(ServerChanBackend(sckey, client, serverchan_url))
+
+    webhook = os.environ.get('NOTIFY_WEBHOOK', '').strip()
+    if webhook:
+        backends.append(WebhookBackend(webhook, client))
+
+    smtp_host = os.environ.get('SMTP_HOST', '').strip()
+    recipients = [r.strip() for r in os.environ.get('SMTP_TO', '').split(',') if r.strip()]
+    if smtp_host and recipients:
+        user = os.environ.get('SMTP_USER', '').strip() or None
+        try:
+            port = int(os.environ.get('SMTP_PORT') or 465)
+        except ValueError:
+            logger.warning("[警告] SMTP_PORT 无效，使用默认值: 465")
+            port = 465
+        backends.append(SmtpBackend(smtp_host, port, os.environ.get('SMTP_FROM', '').strip() or user,
+                                    recipients, user, os.environ.get('SMTP_PASSWORD')))
+    return backends
+
+
+# ==================== 队列与并发发送 ====================
+
+class Notifier:
+    """
+    通知队列与并发发送
+    :param backends: 启用的推送后端
+    :param path: 队列文件路径，None 表示仅在内存中生效
+    :param max_queue: 队列最多保留的消息数（超出时丢弃最旧的）
+    :param report: 运行报告，各后端的发送记为 notify 阶段
+    """
+
+    def __init__(self, backends: List[NotifierBackend], path: str = None,
+                 max_queue: int = 20, report: RunReport = None):
+        self.backends = backends
+        self.path = path
+        self.max_queue = max_queue
+        self.report = report or RunReport()
+        self.queue: List[Message] = []
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._started = 0.0
+        self._dirty = False
+
+    @classmethod
+    def load(cls, backends: List[NotifierBackend], path: str = None, **kwargs) -> "Notifier":
+        """读取上次运行遗留的队列，已不再启用的后端从待发状态中移除"""
+        notifier = cls(backends, path, **kwargs)
+        if not path or not os.path.exists(path):
+            return notifier
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                messages = [Message.from_dict(item) for item in json.load(f)]
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.warning("[警告] 通知队列文件读取失败，已重置: %s", e)
+            notifier._dirty = True
+            return notifier
+        names = {backend.name for backend in backends}
+        for message in messages:
+            message.pending &= names
+        notifier.queue = [m for m in messages if m.pending]
+        notifier._dirty = len(notifier.queue) != len(messages)
+        if notifier.queue:
+            logger.info("[通知] 队列中有 %s 条待发通知", len(notifier.queue))
+        return notifier
+
+    def warm_urls(self) -> List[str]:
+        """HTTP后端的推送地址，供提前建立连接"""
+        return [b.url for b in self.backends if b.url]
+
+    @property
+    def has_retries(self) -> bool:
+        """队列中是否有之前发送失败的消息"""
+        return any(m.attempts for m in self.queue)
+
+    def enqueue(self, title: str, body: str):
+        """加入队列，等到下一次 dispatch 时与其他待发消息合并发送"""
+        with self._lock:
+            self.queue.append(Message(title, body, pending=[b.name for b in self.backends]))
+            if len(self.queue) > self.max_queue:
+                dropped = len(self.queue) - self.max_queue
+                del self.queue[:dropped]
+                logger.warning("[警告] 通知队列已满，丢弃最早的 %s 条", dropped)
+            self._dirty = True
+
+    def digest(self, backend_name: str) -> Tuple[Optional[str], Optional[str], List[Message]]:
+        """合并该后端所有待发消息，返回 (标题, 正文, 包含的消息)"""
+        with self._lock:
+            batch = [m for m in self.queue if backend_name in m.pending]
+        if not batch:
+            return None, None, []
+        if len(batch) == 1:
+            return batch[0].title, batch[0].body, batch
+        title = f"{batch[-1].title}（{len(batch)}条）"
+        return title, DIGEST_SEPARATOR.join(m.body for m in batch), batch
+
+    def dispatch(self, timeout: float):
+        """
+        在后台线程中向各后端同时发送摘要，立即返回；调用 wait 等待结果
+        :param timeout: 单个后端请求的超时（秒）
+        """
+        self._started = get_clock().monotonic()
+        for backend in self.backends:
+            title, body, batch = self.digest(backend.name)
+            if not batch:
+                continue
+            thread = threading.Thread(target=self._send, args=(backend, title, body, batch, timeout),
+                                      name=f"notify-{backend.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _send(self, backend: NotifierBackend, title: str, body: str, batch: List[Message], timeout: float):
+        try:
+            with self.report.span("notify", backend=backend.name, messages=len(batch)):
+                backend.send(title, body, timeout)
+        except (Exception, DeadlineExceeded) as e:
+            logger.warning("[失败] %s推送失败，已加入重试队列: %s", backend.label, e)
+            with self._lock:
+                for message in batch:
+                    message.attempts += 1
+                self._dirty = True
+            return
+        with self._lock:
+            for message in batch:
+                message.pending.discard(backend.name)
+            self.queue = [m for m in self.queue if m.pending]
+            self._dirty = True
+        logger.info("[成功] %s推送成功（%s 条）", backend.label, len(batch))
+
+    def wait(self, timeout: float) -> bool:
+        """
+        等待 dispatch 发出的请求完成，总时长不超过 timeout（从 dispatch 开始计）
+        超时未完成的后端保留在队列中，下次运行重试
+        :return: 是否全部完成
+        """
+        for thread in self._threads:
+            thread.join(max(timeout - (get_clock().monotonic() - self._started), 0))
+        unfinished = [t.name for t in self._threads if t.is_alive()]
+        self._threads = []
+        if unfinished:
+            logger.warning("[超时] 推送未在 %s 秒内完成（%s），保留到下次运行", timeout, ", ".join(unfinished))
+        return not unfinished
+
+    def save(self):
+        """保存待发队列（队列为空时删除文件）"""
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            data = [m.to_dict() for m in self.queue if m.pending]
+            self._dirty = False
+        try:
+            if data:
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+            elif os.path.exists(self.path):
+                os.remove(self.path)
+        except OSError as e:
+            logger.warning("[警告] 通知队列保存失败: %s", e)
@@ -0,0 +1,198 @@
+"""
+分阶段性能剖析
+开启后对标记的阶段分别采集 cProfile 和 tracemalloc：
+  - <序号>-<阶段>.prof        cProfile 统计（含嵌套子阶段），可用 snakeviz / pstats 查看
+  - <序号>-<阶段>.tracemalloc 阶段结束时的内存快照，可用 tracemalloc.Snapshot.load 加载
+  - summary.txt              各阶段耗时、峰值内存和 Top-N 函数/分配位置
+未开启时 @profiled 只多一次函数调用和 None 判断
+"""
+import functools
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from util.lazy import lazy_import
+from util.log import get_logger
+
+# 仅在开启剖析时才需要（tracemalloc 会连带导入 pickle 等）
+cProfile = lazy_import("cProfile")
+pstats = lazy_import("pstats")
+tracemalloc = lazy_import("tracemalloc")
+
+logger = get_logger(__name__)
+
+# tracemalloc 保留的调用栈深度（1 即可按分配位置汇总）
+TRACE_FRAMES = 1
+
+
+def _format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024 or unit == "MB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _short_path(path: str) -> str:
+    """项目内文件显示相对路径，其余保持原样"""
+    if os.path.isabs(path) and path.startswith(os.getcwd() + os.sep):
+        return os.path.relpath(path)
+    return path
+
+
+class PhaseProfiler:
+    """
+    分阶段剖析器
+    :param out_dir: 输出目录（作为 Actions artifact 上传）
+    :param top_n: 摘要中每个阶段列出的函数/分配位置数量
+    """
+
+    def __init__(self, out_dir: str, top_n: int = 10):
+        self.out_dir = out_dir
+        self.top_n = top_n
+        self.results: List[Dict] = []
+        self._stack: List[Dict] = []
+        self._seq = 0
+
+    def start(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+    def stop(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        剖析一个阶段；嵌套时先暂停外层的 cProfile（同一时刻只能有一个生效），
+        退出外层时再合并子阶段的统计，使外层结果包含子阶段
+        """
+        entered = time.perf_counter()
+        self._seq += 1
+        stem = os.path.join(self.out_dir, "%02d-%s" % (self._seq, re.sub(r"[^\w.-]+", "_", name)))
+        parent = self._stack[-1] if self._stack else None
+        if parent:
+            parent["profile"].disable()
+            parent["peak"] = max(parent["peak"], tracemalloc.get_traced_memory()[1])
+
+        frame = {"name": name, "seq": self._seq, "stem": stem, "children": [], "peak": 0, "overhead": 0.0,
+                 "profile": cProfile.Profile(), "snapshot": tracemalloc.take_snapshot()}
+        self._stack.append(frame)
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        frame["profile"].enable()
+        try:
+            yield
+        finally:
+            frame["profile"].disable()
+            end = time.perf_counter()
+            self._stack.pop()
+            # 快照、落盘等剖析自身的开销不计入外层耗时
+            self._finish(frame, end - start - frame["overhead"])
+            if parent:
+                parent["children"].append(stem + ".prof")
+                parent["peak"] = max(parent["peak"], frame["peak"])
+                parent["overhead"] += frame["overhead"] + (start - entered) + (time.perf_counter() - end)
+                parent["profile"].enable()
+
+    def _finish(self, frame: Dict, duration: float):
+        current, peak = tracemalloc.get_traced_memory()
+        frame["peak"] = max(frame["peak"], peak)
+
+        prof_path = frame["stem"] + ".prof"
+        stats = pstats.Stats(frame["profile"])
+        for child in frame["children"]:
+            stats.add(child)
+        stats.dump_stats(prof_path)
+
+        snapshot = tracemalloc.take_snapshot()
+        snapshot.dump(frame["stem"] + ".tracemalloc")
+        # 排除剖析工具自身的分配（比 filter_traces 逐条匹配快得多）
+        own = {cProfile.__file__, pstats.__file__, tracemalloc.__file__, __file__}
+        growth = [d for d in snapshot.compare_to(frame["snapshot"], "lineno")
+                  if d.traceback[0].filename not in own]
+
+        self.results.append({
+            "seq": frame["seq"],
+            "phase": frame["name"],
+            "file": prof_path,
+            "duration_ms": round(duration * 1000, 2),
+            "peak_bytes": frame["peak"],
+            "net_bytes": sum(d.size_diff for d in growth),
+            "top_functions": self._top_functions(stats),
+            "top_allocations": [(_short_path(str(d.traceback)), d.size_diff) for d in growth[:self.top_n]
+                                if d.size_diff > 0],
+        })
+        self.results.sort(key=lambda r: r["seq"])
+
+    def _top_functions(self, stats) -> List[tuple]:
+        """按累计耗时排序的 Top-N 函数 [(位置, 调用次数, 累计秒数)]"""
+        rows = []
+        for (filename, line, func), (cc, nc, tt, ct, callers) in stats.stats.items():
+            location = func if filename == "~" else f"{_short_path(filename)}:{line}({func})"
+            rows.append((location, nc, ct))
+        rows.sort(key=lambda r: r[2], reverse=True)
+        return rows[:self.top_n]
+
+    def summary(self) -> str:
+        lines = [f"[剖析] 共 {len(self.results)} 个阶段，输出目录 {self.out_dir}"]
+        for result in self.results:
+            lines.append(f"[剖析] {result['phase']}: {result['duration_ms']:.1f} ms，"
+                         f"峰值内存 {_format_size(result['peak_bytes'])}，"
+                         f"净增 {_format_size(result['net_bytes'])}（{os.path.basename(result['file'])}）")
+            for location, calls, cumulative in result["top_functions"]:
+                lines.append(f"    {cumulative * 1000:>9.2f} ms {calls:>6}次  {location}")
+            for location, size in result["top_allocations"]:
+                lines.append(f"    {_format_size(size):>12} 分配  {location}")
+        return "\n".join(lines)
+
+    def write_summary(self) -> str:
+        text = self.summary()
+        path = os.path.join(self.out_dir, "summary.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        return text
+
+
+_active: Optional[PhaseProfiler] = None
+
+
+def start_profiling(out_dir: str, top_n: int = 10) -> PhaseProfiler:
+    """开启全局剖析（之后 @profiled 标记的阶段都会被采集）"""
+    global _active
+    _active = PhaseProfiler(out_dir, top_n)
+    _active.start()
+    logger.info("[剖析] 已开启性能剖析，输出目录 %s", out_dir)
+    return _active
+
+
+def stop_profiling():
+    """关闭全局剖析，写出并打印 Top-N 摘要"""
+    global _active
+    profiler, _active = _active, None
+    if profiler is None:
+        return
+    profiler.stop()
+    try:
+        logger.info("%s", profiler.write_summary())
+    except OSError as e:
+        logger.warning("[警告] 剖析摘要写入失败: %s", e)
+
+
+def profiled(name: str):
+    """标记需要剖析的阶段（未开启剖析时直接调用原函数）"""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return fn(*args, **kwargs)
+            with _active.phase(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,73 @@
+"""
+重试策略
+区分可重试（超时、连接错误、5xx、429）与不可重试（鉴权失败等）错误，
+可重试错误按指数退避加随机抖动等待，并优先遵循服务端的 Retry-After
+"""
+import random
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+
+from util.clock import get_clock
+
+# 可重试的HTTP状态码
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# 可重试的异常类型（网络抖动类）
+RETRY_EXCEPTIONS = (requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头（秒数或HTTP日期），无法解析时返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - get_clock().time(), 0.0)
+
+
+class RetryPolicy:
+    """
+    重试策略
+    :param max_attempts: 最大尝试次数（含首次）
+    :param base_delay: 退避基数（秒），第n次重试等待上限为 base_delay * 2**n
+    :param max_delay: 单次等待上限（秒）
+    :param jitter: 是否使用全抖动（在 [0, 上限] 内随机）
+    :param rng: 抖动使用的随机数，默认取当前时钟的随机数（虚拟时钟下可重复）
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+                 jitter: bool = True, retry_statuses=RETRY_STATUSES, rng: random.Random = None):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.rng = rng or get_clock().rng
+
+    def is_retryable(self, error) -> bool:
+        """
+        判断错误是否值得重试
+        :param error: HTTP状态码或异常对象
+        """
+        if isinstance(error, int):
+            return error in self.retry_statuses
+        return isinstance(error, RETRY_EXCEPTIONS)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        第 attempt 次失败后的等待时间（attempt 从0开始）
+        服务端给出 Retry-After 时以其为准
+        """
+        if retry_after is not None:
+            return retry_after
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return self.rng.uniform(0, ceiling) if self.jitter else ceiling
@@ -0,0 +1,158 @@
+"""
+运行历史
+每次运行结束后追加一行JSON（JSON Lines）：结果、使用的Token层级、各阶段耗时和重试次数，
+供 `python main.py history` 查看数周内的耗时趋势和Token刷新频率，不必翻 Actions 日志
+"""
+import json
+import math
+import os
+import unicodedata
+from datetime import datetime, tzinfo
+from typing import Dict, List, Optional, Sequence
+
+from util.run_report import RunReport
+
+# 使用缓存Token、无需刷新的层级；其余层级（login_token / access_token / password）视为一次刷新
+CACHED_TIERS = ("app_token_cached", "app_token_verified")
+
+# 文件超过该大小时压缩为最近 max_entries 条（追加时只看文件大小，不必每次读全文件）
+COMPACT_BYTES = 512 * 1024
+
+
+def entry_from_report(report: RunReport, **extra) -> Dict:
+    """从运行报告提取一条历史记录"""
+    return {
+        "started_at": round(report.started_at, 3),
+        "duration_ms": report.to_dict()["duration_ms"],
+        "success": report.meta.get("success"),
+        "total_steps": report.meta.get("total_steps"),
+        "token_tier": report.meta.get("token_tier"),
+        "phases": {phase: round(ms, 2) for phase, ms in report.phase_totals().items()},
+        "requests": len(report.http),
+        # HTTP层的重试，加上执行器重新提交步数的次数（每次提交都是新的请求，attempt 为0）
+        "retries": sum(1 for r in report.http if r.get("attempt"))
+                   + max((report.meta.get("update_step_attempts") or 1) - 1, 0),
+        "errors": sum(1 for r in report.http if r.get("error") or (r.get("status") or 0) >= 500),
+        **extra,
+    }
+
+
+class RunHistory:
+    """
+    JSON Lines 格式的运行历史
+    :param path: 历史文件路径
+    :param max_entries: 最多保留的记录数
+    """
+
+    def __init__(self, path: str, max_entries: int = 1000):
+        self.path = path
+        self.max_entries = max_entries
+
+    def append(self, entry: Dict):
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+        if os.path.getsize(self.path) > COMPACT_BYTES:
+            self._compact()
+
+    def _compact(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        if len(lines) <= self.max_entries:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(lines[-self.max_entries:])
+        os.replace(tmp, self.path)
+
+    def load(self, last: Optional[int] = None) -> List[Dict]:
+        """读取历史（按时间顺序），跳过损坏的行"""
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict):
+                    entries.append(entry)
+        return entries[-last:] if last else entries
+
+
+def percentile(values: Sequence[float], pct: float) -> Optional[float]:
+    """线性插值百分位，pct 取 0-100"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _width(text: str) -> int:
+    """终端显示宽度（中文等宽字符占两列）"""
+    return sum(2 if unicodedata.east_asian_width(ch) in "WF" else 1 for ch in text)
+
+
+def _ljust(text: str, width: int) -> str:
+    return text + " " * max(width - _width(text), 0)
+
+
+def _rjust(text: str, width: int) -> str:
+    return " " * max(width - _width(text), 0) + text
+
+
+def _result(entry: Dict) -> str:
+    success = entry.get("success")
+    return "-" if success is None else ("成功" if success else "失败")
+
+
+def format_history(entries: List[Dict], tz: tzinfo = None, percentiles: bool = False) -> str:
+    """
+    格式化历史：逐条记录、成功率、Token刷新次数和各阶段耗时统计
+    :param percentiles: 阶段耗时同时给出 p50 / p95
+    """
+    if not entries:
+        return "[历史] 暂无运行记录"
+
+    def when(entry: Dict) -> str:
+        return datetime.fromtimestamp(entry.get("started_at", 0), tz).strftime("%Y-%m-%d %H:%M")
+
+    lines = [f"[历史] 最近 {len(entries)} 次运行（{when(entries[0])} ~ {when(entries[-1])}）",
+             "    " + " ".join([_ljust("时间", 16), _ljust("结果", 4), _ljust("Token层级", 20), _rjust("耗时ms", 8),
+                                _rjust("请求", 4), _rjust("重试", 4), _rjust("步数", 6)])]
+    for entry in entries:
+        lines.append(f"    {when(entry):<16} {_ljust(_result(entry), 4)} {entry.get('token_tier') or '-':<20} "
+                     f"{entry.get('duration_ms', 0):>8.0f} {entry.get('requests', 0):>4} "
+                     f"{entry.get('retries', 0):>4} {entry.get('total_steps') or 0:>6}")
+
+    finished = [e for e in entries if e.get("success") is not None]
+    succeeded = sum(1 for e in finished if e["success"])
+    if finished:
+        lines.append(f"[历史] 成功率 {succeeded}/{len(finished)}（{succeeded / len(finished):.1%}），"
+                     f"重试 {sum(e.get('retries', 0) for e in entries)} 次")
+    refreshes: Dict[str, int] = {}
+    for entry in entries:
+        tier = entry.get("token_tier")
+        if tier and tier not in CACHED_TIERS:
+            refreshes[tier] = refreshes.get(tier, 0) + 1
+    detail = "，".join(f"{tier} {count}" for tier, count in refreshes.items())
+    lines.append(f"[历史] Token刷新 {sum(refreshes.values())} 次" + (f"（{detail}）" if detail else ""))
+
+    # 各阶段耗时：整次运行 + 各阶段（按首次出现顺序）
+    series: Dict[str, List[float]] = {"total": [e["duration_ms"] for e in entries if "duration_ms" in e]}
+    for entry in entries:
+        for phase, ms in (entry.get("phases") or {}).items():
+            series.setdefault(phase, []).append(ms)
+    header = f"    {_ljust('阶段', 30)} {_rjust('次数', 4)} {_rjust('平均ms', 9)}"
+    if percentiles:
+        header += f" {'p50':>9} {'p95':>9}"
+    lines += ["[历史] 阶段耗时", header]
+    for phase, values in series.items():
+        row = f"    {phase:<30} {len(values):>4} {sum(values) / len(values):>9.1f}"
+        if percentiles:
+            row += f" {percentile(values, 50):>9.1f} {percentile(values, 95):>9.1f}"
+        lines.append(row)
+    return "\n".join(lines)
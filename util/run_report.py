@@ -0,0 +1,140 @@
+"""
+运行报告
+记录各阶段耗时和每次HTTP请求（接口、状态码、字节数、耗时），
+运行结束后写出JSON报告，可选写出Prometheus textfile
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from util.clock import get_clock
+
+
+class RunReport:
+    """单次运行的阶段耗时与HTTP请求记录"""
+
+    def __init__(self):
+        self.started_at = get_clock().time()
+        self._t0 = time.perf_counter()
+        self.phases: List[Dict[str, Any]] = []
+        self.http: List[Dict[str, Any]] = []
+        self.meta: Dict[str, Any] = {}
+        # 阶段栈按线程区分：后台线程（如推送通知）的阶段和请求不会挂到主线程当前阶段下
+        self._local = threading.local()
+
+    @property
+    def _stack(self) -> List[str]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, phase: str, **attrs):
+        """
+        计时一个阶段，嵌套阶段以 / 连接父阶段名
+        异常会被记录后继续抛出（包括 DeadlineExceeded）
+        """
+        name = "/".join(self._stack + [phase])
+        self._stack.append(phase)
+        record = {"phase": name, "start_ms": self._elapsed_ms(), **attrs}
+        start = time.perf_counter()
+        try:
+            yield record
+            record.setdefault("ok", True)
+        except BaseException as e:
+            record["ok"] = False
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            self._stack.pop()
+            self.phases.append(record)
+
+    def record_http(self, method: str, endpoint: str, status: Optional[int], duration: float,
+                    bytes_sent: int = 0, bytes_received: int = 0, attempt: int = 0, error: str = None):
+        """记录一次HTTP请求（endpoint 只保留主机和路径，不含查询参数）"""
+        record = {
+            "phase": "/".join(self._stack) or None,
+            "method": method,
+            "endpoint": endpoint,
+            "status": status,
+            "duration_ms": round(duration * 1000, 2),
+            "bytes_sent": bytes_sent,
+            "bytes_received": bytes_received,
+            "attempt": attempt,
+        }
+        if error:
+            record["error"] = error
+        self.http.append(record)
+
+    def set(self, key: str, value):
+        self.meta[key] = value
+
+    def _elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self._t0) * 1000, 2)
+
+    def phase_totals(self) -> Dict[str, float]:
+        """各阶段累计耗时（毫秒）"""
+        totals: Dict[str, float] = {}
+        for record in self.phases:
+            totals[record["phase"]] = totals.get(record["phase"], 0) + record["duration_ms"]
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "started_at": self.started_at,
+            "duration_ms": self._elapsed_ms(),
+            "meta": self.meta,
+            "phases": self.phases,
+            "http": self.http,
+        }
+
+    def summary(self) -> str:
+        """人类可读的阶段耗时摘要"""
+        lines = [f"[耗时] {phase}: {ms:.0f} ms" for phase, ms in self.phase_totals().items()]
+        lines.append(f"[耗时] HTTP请求 {len(self.http)} 次，合计 "
+                     f"{sum(r['duration_ms'] for r in self.http):.0f} ms")
+        return "\n".join(lines)
+
+    def write_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def write_prometheus(self, path: str):
+        """写出 node_exporter textfile collector 格式的指标"""
+        lines = [
+            "# HELP zepp_run_duration_seconds Total run duration.",
+            "# TYPE zepp_run_duration_seconds gauge",
+            f"zepp_run_duration_seconds {self._elapsed_ms() / 1000:.3f}",
+            "# HELP zepp_run_timestamp_seconds Run start time.",
+            "# TYPE zepp_run_timestamp_seconds gauge",
+            f"zepp_run_timestamp_seconds {self.started_at:.0f}",
+            "# HELP zepp_phase_duration_seconds Duration of each run phase.",
+            "# TYPE zepp_phase_duration_seconds gauge",
+        ]
+        for phase, ms in self.phase_totals().items():
+            lines.append(f'zepp_phase_duration_seconds{{phase="{phase}"}} {ms / 1000:.3f}')
+
+        lines += [
+            "# HELP zepp_http_requests_total HTTP requests by endpoint and status.",
+            "# TYPE zepp_http_requests_total counter",
+        ]
+        counts: Dict[tuple, int] = {}
+        for r in self.http:
+            key = (r["endpoint"], r["status"])
+            counts[key] = counts.get(key, 0) + 1
+        for (endpoint, status), count in counts.items():
+            lines.append(f'zepp_http_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+
+        success = self.meta.get("success")
+        if success is not None:
+            lines += [
+                "# HELP zepp_run_success Whether the run succeeded.",
+                "# TYPE zepp_run_success gauge",
+                f"zepp_run_success {1 if success else 0}",
+            ]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
@@ -0,0 +1,77 @@
+"""
+Token有效期管理
+根据 TokenRecord 中各级Token的签发时间判断是否新鲜，
+新鲜的Token直接使用，临近过期才进行联网校验，并根据校验结果学习实际有效期
+"""
+from typing import Dict, Optional
+
+from util.token_record import TokenRecord
+
+# 新鲜度状态
+FRESH = "fresh"
+NEAR_EXPIRY = "near_expiry"
+EXPIRED = "expired"
+UNKNOWN = "unknown"
+
+# 学习到的有效期下限，避免一次偶发失效把TTL压到接近0
+MIN_LEARNED_TTL = 3600
+
+# 失效时已使用时长不足当前TTL的该比例时不学习：过早失效多为服务端注销、
+# 异地登录等偶发原因，不代表有效期变短
+MIN_LEARN_FRACTION = 0.5
+
+
+class TokenCache:
+    """
+    Token新鲜度判断与有效期学习
+    :param ttl: 各级Token的默认有效期（秒）
+    :param refresh_margin: 剩余有效期低于该比例时视为临近过期，需要联网校验
+    """
+
+    def __init__(self, ttl: Dict[str, int], refresh_margin: float = 0.2):
+        self.default_ttl = dict(ttl)
+        self.refresh_margin = refresh_margin
+
+    def ttl(self, record: TokenRecord, tier: str) -> int:
+        """有效期（秒）：优先使用学习值"""
+        return record.learned_ttl(tier) or self.default_ttl[tier]
+
+    def age(self, record: TokenRecord, tier: str, now_ms: int = None) -> Optional[float]:
+        """Token已使用时长（秒），无时间戳时返回None"""
+        return record.age(tier, now_ms)
+
+    def freshness(self, record: Optional[TokenRecord], tier: str, now_ms: int = None,
+                  margin: float = None) -> str:
+        """
+        判断Token新鲜度
+        :param margin: 临近过期比例，默认使用 refresh_margin
+        """
+        if record is None or not record.token(tier):
+            return EXPIRED
+        age = record.age(tier, now_ms)
+        if age is None:
+            return UNKNOWN
+        ttl = self.ttl(record, tier)
+        margin = self.refresh_margin if margin is None else margin
+        if age >= ttl:
+            return EXPIRED
+        if age >= ttl * (1 - margin):
+            return NEAR_EXPIRY
+        return FRESH
+
+    def is_fresh(self, record: Optional[TokenRecord], tier: str, now_ms: int = None) -> bool:
+        return self.freshness(record, tier, now_ms) == FRESH
+
+    def observe_valid(self, record: TokenRecord, tier: str, now_ms: int = None):
+        """联网确认Token仍有效：若已超过当前TTL，则延长学习值"""
+        age = record.age(tier, now_ms)
+        if age is not None and age > self.ttl(record, tier):
+            record.set_learned_ttl(tier, int(age))
+
+    def invalidate(self, record: TokenRecord, tier: str, now_ms: int = None):
+        """Token确认失效：已使用时长接近当前TTL时缩短学习值，并移除该Token"""
+        age = record.age(tier, now_ms)
+        ttl = self.ttl(record, tier)
+        if age is not None and ttl * MIN_LEARN_FRACTION <= age < ttl:
+            record.set_learned_ttl(tier, max(int(age), MIN_LEARNED_TTL))
+        record.clear_token(tier)
@@ -0,0 +1,189 @@
+"""
+Token记录
+以整数毫秒时间戳保存三级Token及签发时间，提供按层级的新鲜度辅助方法，
+支持紧凑二进制序列化（加密存储使用）和旧版JSON字典格式互转
+"""
+import json
+import struct
+from typing import Any, Dict, Optional
+
+from util.clock import now_ms
+
+# Token层级（由低到高依次可以换取上一层）
+TOKEN_TIERS = ("access_token", "login_token", "app_token")
+
+BINARY_VERSION = 1
+
+# 版本 | 三个签发时间(ms) | 三个学习到的有效期(s)
+_FIXED = struct.Struct(">BqqqIII")
+_STR_LEN = struct.Struct(">H")
+
+
+def _parse_ms(value) -> int:
+    """解析毫秒时间戳（旧版JSON中为 "%.0f" 格式的字符串），无效时返回0"""
+    if value in (None, ""):
+        return 0
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _pack_str(value: Optional[str]) -> bytes:
+    data = b"" if value is None else str(value).encode("utf-8")
+    return _STR_LEN.pack(len(data)) + data
+
+
+def _unpack_str(data: bytes, offset: int) -> (Optional[str], int):
+    (length,) = _STR_LEN.unpack_from(data, offset)
+    offset += _STR_LEN.size
+    value = bytes(data[offset:offset + length]).decode("utf-8") if length else None
+    return value, offset + length
+
+
+class TokenRecord:
+    """
+    单个账号的Token缓存记录，时间戳均为整数毫秒（0 表示未知）
+    定义为 __slots__ 类以控制冷启动开销（见 benchmarks/bench_startup.py）
+    """
+
+    __slots__ = ("access_token", "access_token_time", "login_token", "login_token_time",
+                 "app_token", "app_token_time", "user_id", "device_id",
+                 "access_token_ttl", "login_token_ttl", "app_token_ttl", "extra")
+
+    def __init__(self, access_token: Optional[str] = None, access_token_time: int = 0,
+                 login_token: Optional[str] = None, login_token_time: int = 0,
+                 app_token: Optional[str] = None, app_token_time: int = 0,
+                 user_id: Optional[str] = None, device_id: Optional[str] = None,
+                 access_token_ttl: int = 0, login_token_ttl: int = 0, app_token_ttl: int = 0,
+                 extra: Dict[str, Any] = None):
+        self.access_token = access_token
+        self.access_token_time = access_token_time
+        self.login_token = login_token
+        self.login_token_time = login_token_time
+        self.app_token = app_token
+        self.app_token_time = app_token_time
+        self.user_id = user_id
+        self.device_id = device_id
+        # 学习到的有效期（秒），0 表示使用默认值
+        self.access_token_ttl = access_token_ttl
+        self.login_token_ttl = login_token_ttl
+        self.app_token_ttl = app_token_ttl
+        # 旧版字典中无法识别的字段，原样保留以便往返
+        self.extra = extra if extra is not None else {}
+
+    def __eq__(self, other):
+        if not isinstance(other, TokenRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"TokenRecord({fields})"
+
+    # ---------- 层级辅助 ----------
+
+    def token(self, tier: str) -> Optional[str]:
+        return getattr(self, tier)
+
+    def issued_at(self, tier: str) -> int:
+        return getattr(self, f"{tier}_time")
+
+    def learned_ttl(self, tier: str) -> int:
+        return getattr(self, f"{tier}_ttl")
+
+    def set_learned_ttl(self, tier: str, seconds: int):
+        setattr(self, f"{tier}_ttl", int(seconds))
+
+    def set_token(self, tier: str, value: Optional[str], issued_ms: int = None):
+        """写入新签发的Token并记录签发时间"""
+        setattr(self, tier, value)
+        setattr(self, f"{tier}_time", now_ms() if issued_ms is None else issued_ms)
+
+    def clear_token(self, tier: str):
+        """移除失效Token，保留签发时间用于有效期学习"""
+        setattr(self, tier, None)
+
+    def age(self, tier: str, now: int = None) -> Optional[float]:
+        """Token已使用时长（秒），无签发时间时返回None"""
+        issued = self.issued_at(tier)
+        if not issued:
+            return None
+        now = now_ms() if now is None else now
+        return max(now - issued, 0) / 1000
+
+    def is_fresh(self, tier: str, ttl: float, margin: float = 0.0, now: int = None) -> bool:
+        """
+        Token存在且已使用时长低于 ttl * (1 - margin)
+        :param ttl: 有效期（秒）
+        :param margin: 预留比例
+        """
+        if not self.token(tier):
+            return False
+        age = self.age(tier, now)
+        return age is not None and age < ttl * (1 - margin)
+
+    # ---------- 旧版JSON字典格式 ----------
+
+    _TEXT_FIELDS = ("access_token", "login_token", "app_token", "user_id", "device_id")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转为旧版 encrypted_tokens.data 中的字典格式（时间戳为字符串）"""
+        data: Dict[str, Any] = dict(self.extra)
+        for tier in TOKEN_TIERS:
+            if self.token(tier) is not None:
+                data[tier] = self.token(tier)
+            if self.issued_at(tier):
+                data[f"{tier}_time"] = "%d" % self.issued_at(tier)
+            if self.learned_ttl(tier):
+                data[f"{tier}_ttl"] = self.learned_ttl(tier)
+        if self.user_id is not None:
+            data["user_id"] = self.user_id
+        if self.device_id is not None:
+            data["device_id"] = self.device_id
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TokenRecord":
+        known = set(cls._TEXT_FIELDS)
+        record = cls()
+        for tier in TOKEN_TIERS:
+            setattr(record, f"{tier}_time", _parse_ms(data.get(f"{tier}_time")))
+            setattr(record, f"{tier}_ttl", _parse_ms(data.get(f"{tier}_ttl")))
+            known.update((f"{tier}_time", f"{tier}_ttl"))
+        for name in cls._TEXT_FIELDS:
+            value = data.get(name)
+            setattr(record, name, None if value is None else str(value))
+        record.extra = {k: v for k, v in data.items() if k not in known}
+        return record
+
+    # ---------- 紧凑二进制格式 ----------
+
+    def to_bytes(self) -> bytes:
+        parts = [_FIXED.pack(BINARY_VERSION,
+                             self.access_token_time, self.login_token_time, self.app_token_time,
+                             self.access_token_ttl, self.login_token_ttl, self.app_token_ttl)]
+        parts.extend(_pack_str(getattr(self, name)) for name in self._TEXT_FIELDS)
+        parts.append(_pack_str(json.dumps(self.extra, ensure_ascii=False, separators=(",", ":"))
+                               if self.extra else None))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, offset: int = 0) -> "TokenRecord":
+        (version, access_time, login_time, app_time,
+         access_ttl, login_ttl, app_ttl) = _FIXED.unpack_from(data, offset)
+        if version != BINARY_VERSION:
+            raise ValueError(f"不支持的TokenRecord版本: {version}")
+        offset += _FIXED.size
+        values = {}
+        for name in cls._TEXT_FIELDS:
+            values[name], offset = _unpack_str(data, offset)
+        extra, offset = _unpack_str(data, offset)
+        return cls(
+            access_token=values["access_token"], access_token_time=access_time,
+            login_token=values["login_token"], login_token_time=login_time,
+            app_token=values["app_token"], app_token_time=app_time,
+            user_id=values["user_id"], device_id=values["device_id"],
+            access_token_ttl=access_ttl, login_token_ttl=login_ttl, app_token_ttl=app_ttl,
+            extra=json.loads(extra) if extra else {},
+        )
@@ -0,0 +1,385 @@
+"""
+加密Token存储
+每个账号单独加密为一条记录，保存时只重新加密发生变化的记录，无变化时不写入。
+提供两种后端：
+  - FileTokenBackend    单个加密文件（默认，配合 Actions artifact 使用）
+  - SqliteTokenBackend  SQLite（WAL模式）加密列存储，只更新变化的行
+
+文件格式（v2），写入采用临时文件+重命名保证原子性：
+    b"ZTS" | 版本(1B) | 记录数(2B) | 索引 N×(记录ID 16B, 偏移 4B, 长度 4B) | 记录密文...
+记录ID为 HMAC-SHA256(密钥, 账号) 的前16字节，文件中不出现明文账号；
+记录密文为 encrypt_data(0x01 | 账号长度(2B) | 账号 | TokenRecord二进制)。
+早期的JSON记录（{"user": 账号, "info": Token信息}）和旧版（整个字典加密为一个JSON）
+文件均可直接读取，下次保存时自动改写为二进制记录。
+"""
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from util.aes_help import encrypt_data, decrypt_data
+from util.clock import now_ms
+from util.log import get_logger
+from util.token_record import TokenRecord
+
+logger = get_logger(__name__)
+
+MAGIC = b"ZTS"
+FORMAT_VERSION = 2
+
+_HEADER = struct.Struct(">3sBH")
+_INDEX_ENTRY = struct.Struct(">16sII")
+_USER_LEN = struct.Struct(">H")
+
+# 记录明文的首字节：二进制记录；早期JSON记录以 "{" 开头
+RECORD_BINARY = b"\x01"
+
+
+
+def _encode(user: str, record: TokenRecord) -> bytes:
+    name = user.encode("utf-8")
+    return RECORD_BINARY + _USER_LEN.pack(len(name)) + name + record.to_bytes()
+
+
+def _decode(plain: bytes) -> (str, TokenRecord):
+    if plain[:1] == RECORD_BINARY:
+        (length,) = _USER_LEN.unpack_from(plain, 1)
+        start = 1 + _USER_LEN.size
+        user = plain[start:start + length].decode("utf-8")
+        return user, TokenRecord.from_bytes(plain, start + length)
+    record = json.loads(plain.decode("utf-8", errors="strict"))
+    return record["user"], TokenRecord.from_dict(record["info"])
+
+
+def atomic_write(path: str, data: bytes):
+    """写入临时文件后重命名，避免中途崩溃留下截断的文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class TokenBackend:
+    """
+    Token存储后端接口
+    子类实现 load/save；基类负责记录ID和脏标记（加载时的记录明文）
+    :param key: 16字节AES密钥
+    """
+
+    name = "base"
+
+    def __init__(self, key: bytes):
+        self.key = key
+        # 账号 -> 加载时的记录明文，用于判断是否变化
+        self._clean: Dict[str, bytes] = {}
+
+    def record_id(self, user: str) -> bytes:
+        return hmac.new(self.key, user.encode("utf-8"), hashlib.sha256).digest()[:16]
+
+    def _encrypt_record(self, plain: bytes) -> bytes:
+        return encrypt_data(plain, self.key, None)
+
+    def _decrypt_record(self, blob: bytes) -> (str, TokenRecord):
+        """解密一条记录，并以磁盘上的明文作为脏标记快照（JSON记录因此会在保存时改写）"""
+        plain = decrypt_data(blob, self.key, None)
+        user, record = _decode(plain)
+        self._clean[user] = plain
+        return user, record
+
+    def _diff(self, tokens: Dict[str, TokenRecord],
+              force: bool = False) -> Tuple[List[Tuple[str, bytes]], List[str]]:
+        """
+        对比加载时的快照
+        :return: (变化的 [(账号, 记录明文)], 被删除的账号列表)
+        """
+        changed = []
+        for user, record in tokens.items():
+            plain = _encode(user, record)
+            if force or self._clean.get(user) != plain:
+                changed.append((user, plain))
+        removed = [u for u in self._clean if u not in tokens]
+        return changed, removed
+
+    def load(self, users: Iterable[str] = None) -> Dict[str, TokenRecord]:
+        """
+        加载Token
+        :param users: 只解密这些账号的记录；None 表示全部
+        :return: 账号 -> Token记录
+        """
+        raise NotImplementedError
+
+    def save(self, tokens: Dict[str, TokenRecord]) -> bool:
+        """
+        保存Token：只写入变化的记录
+        :return: 是否实际写入
+        """
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """存储中的记录数（含无法用当前密钥定位的记录），不解密"""
+        raise NotImplementedError
+
+    def reset(self):
+        """丢弃已读取的内容（如密钥错误无法解密），下次保存时整体重写"""
+        self._clean = {}
+
+    def close(self):
+        pass
+
+
+class FileTokenBackend(TokenBackend):
+    """
+    单文件后端（v2格式）
+    :param path: 存储文件路径
+    :param key: 16字节AES密钥
+    """
+
+    name = "file"
+
+    def __init__(self, path: str, key: bytes):
+        super().__init__(key)
+        self.path = path
+        # 记录ID -> 磁盘上的密文（未解密的记录原样保留）
+        self._blobs: Dict[bytes, bytes] = {}
+        self._legacy = False
+        self._read = False
+
+    # ---------- 读取 ----------
+
+    def _read_file(self) -> Optional[bytes]:
+        self._read = True
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "rb") as f:
+            data = f.read()
+        return data or None
+
+    def _parse(self, data: bytes):
+        """解析 v2 文件头和索引，只切出各记录密文，不解密"""
+        magic, version, count = _HEADER.unpack_from(data, 0)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"不支持的Token存储版本: {version}")
+        index_end = _HEADER.size + count * _INDEX_ENTRY.size
+        if len(data) < index_end:
+            raise ValueError("Token存储索引不完整")
+        view = memoryview(data)
+        for i in range(count):
+            record_id, offset, length = _INDEX_ENTRY.unpack_from(data, _HEADER.size + i * _INDEX_ENTRY.size)
+            start = index_end + offset
+            if start + length > len(data):
+                raise ValueError("Token存储记录越界（文件可能被截断）")
+            self._blobs[record_id] = bytes(view[start:start + length])
+
+    def load(self, users: Iterable[str] = None) -> Dict[str, TokenRecord]:
+        data = self._read_file()
+        if data is None:
+            return {}
+
+        if not data.startswith(MAGIC):
+            # 旧版整文件JSON格式
+            tokens = json.loads(decrypt_data(data, self.key, None).decode("utf-8", errors="strict"))
+            self._legacy = True
+            return {user: TokenRecord.from_dict(info) for user, info in tokens.items()}
+
+        self._parse(data)
+        if users is None:
+            blobs = list(self._blobs.values())
+        else:
+            blobs = [self._blobs[rid] for rid in map(self.record_id, users) if rid in self._blobs]
+
+        tokens = {}
+        for blob in blobs:
+            user, record = self._decrypt_record(blob)
+            tokens[user] = record
+        return tokens
+
+    def count(self) -> int:
+        if not self._read:
+            data = self._read_file()
+            if data and data.startswith(MAGIC):
+                self._parse(data)
+        return len(self._blobs)
+
+    def reset(self):
+        super().reset()
+        self._blobs = {}
+        self._legacy = True
+        self._read = True
+
+    # ---------- 保存 ----------
+
+    def save(self, tokens: Dict[str, TokenRecord]) -> bool:
+        if not self._read:
+            # 未加载过也要读取索引，保留文件中其它账号的记录
+            data = self._read_file()
+            if data and data.startswith(MAGIC):
+                self._parse(data)
+
+        changed, removed = self._diff(tokens, force=self._legacy)
+        if not (changed or removed or self._legacy):
+            return False
+
+        blobs = dict(self._blobs)
+        for user, plain in changed:
+            blobs[self.record_id(user)] = self._encrypt_record(plain)
+        # 已加载但被删除的账号
+        for user in removed:
+            blobs.pop(self.record_id(user), None)
+
+        atomic_write(self.path, self._serialize(blobs))
+        self._blobs = blobs
+        self._legacy = False
+        for user, plain in changed:
+            self._clean[user] = plain
+        for user in removed:
+            del self._clean[user]
+        return True
+
+    @staticmethod
+    def _serialize(blobs: Dict[bytes, bytes]) -> bytes:
+        parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, len(blobs))]
+        offset = 0
+        for record_id, blob in blobs.items():
+            parts.append(_INDEX_ENTRY.pack(record_id, offset, len(blob)))
+            offset += len(blob)
+        parts.extend(blobs.values())
+        return b"".join(parts)
+
+
+class SqliteTokenBackend(TokenBackend):
+    """
+    SQLite后端（WAL模式）
+    tokens 表按记录ID索引，密文存于 payload 列，只更新变化的行
+    连接允许跨线程使用（异步编排中加载、保存、关闭可能在不同线程），所有访问由锁串行化
+    :param path: 数据库文件路径
+    :param key: 16字节AES密钥
+    :param import_from: 数据库为空时从该 v2/旧版加密文件导入
+    """
+
+    name = "sqlite"
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS tokens ("
+        " record_id BLOB PRIMARY KEY, payload BLOB NOT NULL, updated_at INTEGER NOT NULL)",
+    )
+
+    def __init__(self, path: str, key: bytes, import_from: str = None):
+        super().__init__(key)
+        self.path = path
+        self.import_from = import_from
+        # 可重入：load 导入旧文件时会调用 save
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+
+    def _is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM tokens LIMIT 1").fetchone() is None
+
+    def load(self, users: Iterable[str] = None) -> Dict[str, TokenRecord]:
+        with self._lock:
+            return self._load(users)
+
+    def _load(self, users: Iterable[str] = None) -> Dict[str, TokenRecord]:
+        if self.import_from and self._is_empty() and os.path.exists(self.import_from):
+            migrated = migrate_file_to_sqlite(self.import_from, self)
+            logger.info("[迁移] 已从 %s 导入 %d 个账号的Token", self.import_from, migrated)
+
+        if users is None:
+            rows = self._conn.execute("SELECT payload FROM tokens").fetchall()
+        else:
+            ids = [self.record_id(u) for u in users]
+            if not ids:
+                return {}
+            placeholders = ",".join("?" * len(ids))
+            rows = self._conn.execute(
+                f"SELECT payload FROM tokens WHERE record_id IN ({placeholders})", ids).fetchall()
+
+        tokens = {}
+        for (payload,) in rows:
+            user, record = self._decrypt_record(payload)
+            tokens[user] = record
+        return tokens
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tokens").fetchone()[0]
+
+    def save(self, tokens: Dict[str, TokenRecord]) -> bool:
+        with self._lock:
+            return self._save(tokens)
+
+    def _save(self, tokens: Dict[str, TokenRecord]) -> bool:
+        changed, removed = self._diff(tokens)
+        if not (changed or removed):
+            return False
+
+        now = now_ms()
+        with self._conn:
+            for user, plain in changed:
+                record_id = self.record_id(user)
+                self._conn.execute(
+                    "INSERT INTO tokens (record_id, payload, updated_at) VALUES (?, ?, ?)"
+                    " ON CONFLICT(record_id) DO UPDATE SET payload = excluded.payload,"
+                    " updated_at = excluded.updated_at",
+                    (record_id, self._encrypt_record(plain), now))
+            for user in removed:
+                self._conn.execute("DELETE FROM tokens WHERE record_id = ?", (self.record_id(user),))
+
+        for user, plain in changed:
+            self._clean[user] = plain
+        for user in removed:
+            del self._clean[user]
+        return True
+
+    def close(self):
+        # 合并WAL，保证单个数据库文件即可完整拷贝/上传
+        with self._lock:
+            try:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                self._conn.close()
+
+
+def migrate_file_to_sqlite(file_path: str, backend: SqliteTokenBackend) -> int:
+    """
+    将加密文件（v2或旧版）中的全部Token导入SQLite后端
+    :return: 导入的账号数
+    """
+    source = FileTokenBackend(file_path, backend.key)
+    tokens = source.load()
+    if tokens:
+        backend.save(tokens)
+    return len(tokens)
+
+
+def open_token_backend(kind: str, key: bytes, file_path: str, db_path: str) -> TokenBackend:
+    """
+    按名称创建Token后端
+    :param kind: "file" 或 "sqlite"
+    """
+    kind = (kind or FileTokenBackend.name).strip().lower()
+    if kind == FileTokenBackend.name:
+        return FileTokenBackend(file_path, key)
+    if kind == SqliteTokenBackend.name:
+        return SqliteTokenBackend(db_path, key, import_from=file_path)
+    raise ValueError(f"未知的Token存储后端: {kind}")
@@ -0,0 +1,16 @@
+"""
+异步编排的辅助协程
+requests 是同步库，这里用 asyncio.to_thread 把阻塞调用放到工作线程中，
+协程里可以用 asyncio.gather 让互不依赖的操作同时进行；
+接口调用本身仍由 zepp_helper 在工作线程中同步完成
+"""
+import asyncio
+
+from util.http_client import HttpClient
+
+
+async def warm_up(client: HttpClient, *urls: str) -> int:
+    """同时预热多个主机的连接，返回成功建立的数量"""
+    results = await asyncio.gather(*(asyncio.to_thread(client.warm_up, url) for url in urls),
+                                   return_exceptions=True)
+    return sum(1 for r in results if r is True)